@@ -0,0 +1,54 @@
+"""Compares the latency of rewrite() and atomic_write() for small files.
+
+Usage: python benchmarks/atomic_write.py [iterations] [directory]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rpaths import Path  # noqa: E402
+
+
+CONTENT = b'x' * 4096
+
+
+def with_rewrite(path):
+    with path.rewrite('b') as (r, w):
+        w.write(CONTENT)
+
+
+def with_atomic_write(fsync):
+    def write(path):
+        with path.atomic_write('wb', fsync=fsync) as fp:
+            fp.write(CONTENT)
+    return write
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tmp = Path.tempdir(dir=sys.argv[2] if len(sys.argv) > 2 else None)
+    try:
+        path = tmp / 'file'
+        path.open('wb').close()
+        for label, func in [('rewrite', with_rewrite),
+                            ('atomic_write', with_atomic_write('none')),
+                            ('atomic_write file', with_atomic_write('file')),
+                            ('atomic_write file+dir',
+                             with_atomic_write('file+dir'))]:
+            start = time.time()
+            for i in range(iterations):
+                func(path)
+            elapsed = time.time() - start
+            print("%-22s %8.1f us/write" % (
+                  label, elapsed * 1e6 / iterations))
+    finally:
+        tmp.rmtree()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compares sparse and dense copies of a mostly-empty file.
+
+Usage: python benchmarks/sparse_copy.py [size_in_MiB] [directory]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rpaths import Path  # noqa: E402
+
+
+def make_sparse_file(path, size):
+    """Creates a file of `size` bytes with a few 1 MiB data extents.
+    """
+    chunk = b'\x42' * (1024 * 1024)
+    with path.open('wb') as fp:
+        for offset in range(0, size, size // 8):
+            fp.seek(offset)
+            fp.write(chunk)
+        fp.truncate(size)
+
+
+def allocated(path):
+    return path.stat().st_blocks * 512
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    size *= 1024 * 1024
+    tmp = Path.tempdir(dir=sys.argv[2] if len(sys.argv) > 2 else None)
+    try:
+        src = tmp / 'source.img'
+        make_sparse_file(src, size)
+        print("source: %d MiB apparent, %d MiB allocated" % (
+              size // 2 ** 20, allocated(src) // 2 ** 20))
+        for label, kwargs in [('dense', dict(strategy='readinto')),
+                              ('dense (auto)', dict()),
+                              ('sparse', dict(sparse=True))]:
+            dst = tmp / 'copy.img'
+            start = time.time()
+            used = src.copyfile(dst, **kwargs)
+            elapsed = time.time() - start
+            print("%-14s %-16s %8.3fs  %6d MiB allocated" % (
+                  label, used, elapsed, allocated(dst) // 2 ** 20))
+            dst.remove()
+    finally:
+        tmp.rmtree()
+
+
+if __name__ == '__main__':
+    main()
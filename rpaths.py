@@ -1,18 +1,47 @@
 from __future__ import unicode_literals
 
+import codecs
+import collections
 import contextlib
+import datetime
+import errno
 import functools
+import hashlib
 import io
+import json
+import locale
+import mmap
 import ntpath
 import os
 import posixpath
 import re
+import select
 import shutil
+import stat
+import struct
 import sys
 import tempfile
+import threading
+import time
 
+try:
+    import concurrent.futures as futures
+except ImportError:
+    futures = None
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-__all__ = ["unicode", "Path", "PY3", "PosixPath", "WindowsPath"]
+
+__all__ = ["unicode", "Path", "PY3", "PosixPath", "WindowsPath",
+           "COPY_STRATEGIES"]
 
 __version__ = '1.0.0'
 
@@ -59,6 +88,601 @@ def dict_union(*dcts):
     return dct
 
 
+def stat_time_ns(st, field):
+    """Gets a timestamp from a stat result as an integer of nanoseconds.
+
+    Python 2 doesn't have the ``st_*time_ns`` fields, in which case the float
+    value is converted (losing some precision).
+    """
+    value = getattr(st, 'st_%s_ns' % field, None)
+    if value is None:
+        value = int(getattr(st, 'st_%s' % field) * 1000000000)
+    return value
+
+
+def threaded_map(func, items, workers=None, ordered=True, max_pending=None):
+    """Calls `func` on each item, using a pool of threads.
+
+    This yields ``(item, error, result)`` tuples, where `error` is the
+    exception raised by `func` (and `result` is None) or None.
+
+    :param ordered: If True (the default), results come in the same order as
+        `items`. Else, they come as soon as they are ready.
+
+    :param max_pending: The maximum number of calls submitted to the pool at
+        any given time (by default, four times the number of workers). `items`
+        is consumed lazily.
+
+    If `workers` is None or 1, or if :mod:`concurrent.futures` is not available
+    (it needs to be installed separately on Python 2), the calls happen in the
+    current thread.
+    """
+    if workers is None or workers <= 1 or futures is None:
+        for item in items:
+            try:
+                result = func(item)
+            except Exception as e:
+                yield item, e, None
+            else:
+                yield item, None, result
+        return
+
+    if max_pending is None:
+        max_pending = workers * 4
+    items = iter(items)
+    pending = collections.OrderedDict()
+    executor = futures.ThreadPoolExecutor(workers)
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    pending[executor.submit(func, item)] = item
+            if not pending:
+                break
+            if ordered:
+                done = [next(iter(pending))]
+            else:
+                done, _ = futures.wait(pending,
+                                       return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    yield item, error, None
+                else:
+                    yield item, None, future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_FICLONE = 0x40049409
+
+# Errors meaning that a copy strategy is not supported for these files, and
+# the next one should be tried
+# Errors meaning the strategy is not supported for these files, not that
+# something is wrong with them
+_COPY_FALLBACK_ERRNOS = set(getattr(errno, e)
+                            for e in ('ENOSYS', 'EXDEV', 'EINVAL',
+                                      'EOPNOTSUPP', 'ENOTSUP', 'ETXTBSY')
+                            if hasattr(errno, e))
+
+
+def _copy_reflink(fsrc, fdst):
+    fcntl.ioctl(fdst, _FICLONE, fsrc)
+
+
+def _copy_copy_file_range(fsrc, fdst):
+    while os.copy_file_range(fsrc, fdst, 1 << 30) > 0:
+        pass
+
+
+def _copy_sendfile(fsrc, fdst):
+    offset = 0
+    while True:
+        sent = os.sendfile(fdst, fsrc, offset, 1 << 30)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _copy_readinto(fsrc, fdst):
+    buf = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buf)
+    reader = io.FileIO(fsrc, 'rb', closefd=False)
+    while True:
+        size = reader.readinto(buf)
+        if not size:
+            break
+        pos = 0
+        while pos < size:
+            pos += os.write(fdst, view[pos:size])
+
+
+def _copy_range(fsrc, fdst, start, end):
+    """Copies a range of a file to the same offset in another file.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while start < end:
+                copied = os.copy_file_range(fsrc, fdst, end - start,
+                                            start, start)
+                if copied == 0:
+                    return
+                start += copied
+            return
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    while start < end:
+        data = os.pread(fsrc, min(COPY_BUFFER_SIZE, end - start), start)
+        if not data:
+            return
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fdst, view, start)
+            start += written
+            view = view[written:]
+
+
+def _copy_sparse(fsrc, fdst):
+    size = os.fstat(fsrc).st_size
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(fsrc, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # No more data until the end
+                break
+            raise
+        hole = os.lseek(fsrc, data, os.SEEK_HOLE)
+        _copy_range(fsrc, fdst, data, hole)
+        offset = hole
+    # Creates the trailing hole, if any
+    os.ftruncate(fdst, size)
+
+
+_copy_strategies = collections.OrderedDict()
+if fcntl is not None and sys.platform.startswith('linux'):
+    _copy_strategies['reflink'] = _copy_reflink
+if hasattr(os, 'copy_file_range'):
+    _copy_strategies['copy_file_range'] = _copy_copy_file_range
+if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+    _copy_strategies['sendfile'] = _copy_sendfile
+_copy_strategies['readinto'] = _copy_readinto
+if hasattr(os, 'SEEK_DATA') and hasattr(os, 'pread'):
+    _copy_strategies['sparse'] = _copy_sparse
+
+COPY_STRATEGIES = ('reflink', 'copy_file_range', 'sendfile', 'readinto')
+
+
+def copy_file_contents(src, dst, strategy=None, sparse=False):
+    """Copies the content of the file `src` to `dst`, as fast as possible.
+
+    The strategies in :data:`COPY_STRATEGIES` are tried in order, skipping
+    the ones that are not available on this system or not supported by the
+    filesystems involved:
+
+    * ``'reflink'``: clones the file with the FICLONE ioctl, sharing the data
+      blocks (copy-on-write) on filesystems such as btrfs or XFS
+    * ``'copy_file_range'``: :func:`os.copy_file_range`, where the kernel (or
+      the filesystem or network protocol) does the copy
+    * ``'sendfile'``: :func:`os.sendfile`, which copies in the kernel
+    * ``'readinto'``: a loop reading into a large reused buffer
+
+    Returns the name of the strategy that was used.
+
+    :param strategy: The name of the only strategy to try, or a list of
+        strategies to try in order. By default, all strategies are tried.
+
+    :param sparse: If True, holes in the source file are recreated in the
+        target instead of being written out as zeros. The data extents are
+        found with ``SEEK_DATA``/``SEEK_HOLE`` (strategy ``'sparse'``), after
+        trying ``'reflink'`` which preserves holes too. If the system or
+        filesystem doesn't support it, the other strategies are used.
+    """
+    if strategy is None:
+        strategies = list(COPY_STRATEGIES)
+    elif isinstance(strategy, backend_types):
+        strategies = [strategy]
+    else:
+        strategies = list(strategy)
+    for name in strategies:
+        if name not in COPY_STRATEGIES and name != 'sparse':
+            raise ValueError("Unknown copy strategy %r" % name)
+    if sparse and 'sparse' not in strategies:
+        pos = 1 if strategies[:1] == ['reflink'] else 0
+        strategies.insert(pos, 'sparse')
+    strategies = [name for name in strategies if name in _copy_strategies]
+    if not strategies:
+        raise ValueError("None of the copy strategies %r is available" %
+                         (strategy,))
+
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise getattr(shutil, 'SameFileError', shutil.Error)(
+            "%r and %r are the same file" % (src, dst))
+    binary = getattr(os, 'O_BINARY', 0)
+    # Don't block opening a named pipe, O_NONBLOCK does nothing on files
+    fsrc = os.open(src, os.O_RDONLY | binary | getattr(os, 'O_NONBLOCK', 0))
+    try:
+        src_st = os.fstat(fsrc)
+        if not stat.S_ISREG(src_st.st_mode):
+            raise shutil.SpecialFileError("%r is not a regular file" % src)
+        if strategy is None and src_st.st_size == 0:
+            # Files from /proc and such report a size of 0, and don't work
+            # with the kernel copies
+            strategies = ['readinto']
+        fdst = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | binary,
+                       0o666)
+        try:
+            for i, name in enumerate(strategies):
+                try:
+                    _copy_strategies[name](fsrc, fdst)
+                except (OSError, IOError) as e:
+                    if (e.errno not in _COPY_FALLBACK_ERRNOS or
+                            i + 1 == len(strategies)):
+                        raise
+                    # Start over with the next strategy
+                    os.lseek(fsrc, 0, os.SEEK_SET)
+                    os.lseek(fdst, 0, os.SEEK_SET)
+                    os.ftruncate(fdst, 0)
+                else:
+                    return name
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+
+
+_supports_dir_fd = getattr(os, 'supports_dir_fd', ())
+_supports_fd = getattr(os, 'supports_fd', ())
+DIR_FD_SUPPORTED = (hasattr(os, 'scandir') and os.scandir in _supports_fd and
+                    os.open in _supports_dir_fd and
+                    os.unlink in _supports_dir_fd and
+                    os.rmdir in _supports_dir_fd)
+_O_DIR_NOFOLLOW = (os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) |
+                   getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_CLOEXEC', 0))
+
+
+def _rmtree_fd(dir_fd, onerror):
+    """Removes the content of a directory, given an open descriptor for it.
+
+    Everything is done relative to the descriptors, so full paths never have
+    to be resolved, and symbolic links are never followed.
+    """
+    try:
+        entries = list(os.scandir(dir_fd))
+    except OSError as e:
+        onerror(e)
+        return
+    for entry in entries:
+        name = entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+        try:
+            if is_dir:
+                fd = os.open(name, _O_DIR_NOFOLLOW, dir_fd=dir_fd)
+                try:
+                    _rmtree_fd(fd, onerror)
+                finally:
+                    os.close(fd)
+                os.rmdir(name, dir_fd=dir_fd)
+            else:
+                os.unlink(name, dir_fd=dir_fd)
+        except OSError as e:
+            onerror(e)
+
+
+def _advise_sequential(fd):
+    """Tells the kernel that the file will be read sequentially.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _read_whole(fp, size=None):
+    """Reads the rest of a raw (unbuffered) file object.
+
+    The data is read in a single allocation, using the size from
+    :func:`os.fstat` (files whose size is unknown, such as the ones in
+    ``/proc``, are still read correctly).
+    """
+    if size is None:
+        size = os.fstat(fp.fileno()).st_size
+    data = fp.read(size) if size > 0 else b''
+    rest = fp.readall()
+    if rest:
+        data += rest
+    return data
+
+
+class _ByteBudget(object):
+    """Limits how many bytes are held at once, across threads.
+
+    A single reservation bigger than the limit is allowed when nothing else is
+    held, so that it can't block forever.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.held = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        with self._cond:
+            while (not self.closed and self.held and
+                    self.held + size > self.limit):
+                self._cond.wait()
+            if self.closed:
+                raise RuntimeError("Budget was closed")
+            self.held += size
+
+    def release(self, size):
+        with self._cond:
+            self.held -= size
+            self._cond.notify_all()
+
+    def close(self):
+        """Wakes up and fails all the threads waiting for budget.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def _replace(src, dst):
+    """Renames `src` to `dst`, replacing it if it exists.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif os.name == 'nt' and os.path.exists(dst):
+        os.remove(dst)
+        os.rename(src, dst)
+    else:
+        os.rename(src, dst)
+
+
+def _fsync_dir(path):
+    """Flushes a directory's entries to disk (this is a no-op on Windows).
+    """
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _create_temp_sibling(path):
+    """Creates a file with a unique name next to `path`.
+
+    Contrary to :func:`tempfile.mkstemp`, the usual permissions are used
+    (0o666 minus the umask). Returns ``(fd, temp_path)``.
+    """
+    while True:
+        token = codecs.encode(os.urandom(6), 'hex').decode('ascii')
+        temp = path.parent / (path._to_backend('.') + path.name +
+                              path._to_backend('.%s.tmp' % token))
+        try:
+            fd = os.open(temp.path,
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                         getattr(os, 'O_BINARY', 0) |
+                         getattr(os, 'O_CLOEXEC', 0),
+                         0o666)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        else:
+            return fd, temp
+
+
+def _open_anonymous(directory):
+    """Creates an unnamed file in `directory` with O_TMPFILE, if supported.
+
+    Returns None if it's not supported. The file can later be given a name
+    with :func:`_link_anonymous`.
+    """
+    if (not hasattr(os, 'O_TMPFILE') or
+            os.link not in _supports_dir_fd or
+            os.rename not in _supports_dir_fd or
+            not os.path.isdir('/proc/self/fd')):
+        return None
+    try:
+        return os.open(directory.path,
+                       os.O_TMPFILE | os.O_WRONLY | os.O_CLOEXEC, 0o666)
+    except OSError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.EISDIR, errno.EINVAL):
+            return None
+        raise
+
+
+def _link_anonymous(fd, path):
+    """Gives a name to a file created with :func:`_open_anonymous`.
+
+    This atomically replaces `path` if it exists.
+    """
+    proc_path = '/proc/self/fd/%d' % fd
+    # Going through dir_fd gets us linkat(AT_SYMLINK_FOLLOW), which link()
+    # doesn't do
+    dir_fd = os.open(path.parent.path, _O_DIR_NOFOLLOW)
+    try:
+        try:
+            os.link(proc_path, path.name, dst_dir_fd=dir_fd,
+                    follow_symlinks=True)
+            return
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # linkat() can't replace, so link to a temporary name and rename
+        while True:
+            token = codecs.encode(os.urandom(6), 'hex').decode('ascii')
+            temp = (path._to_backend('.') + path.name +
+                    path._to_backend('.%s.tmp' % token))
+            try:
+                os.link(proc_path, temp, dst_dir_fd=dir_fd,
+                        follow_symlinks=True)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            else:
+                break
+        try:
+            os.rename(temp, path.name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        except OSError:
+            os.unlink(temp, dir_fd=dir_fd)
+            raise
+    finally:
+        os.close(dir_fd)
+
+
+def _journal_encode(path):
+    """Converts a path to unicode for a JSON journal, without loss.
+    """
+    if isinstance(path.path, bytes):
+        return path.path.decode(sys.getfilesystemencoding(),
+                                'surrogateescape' if PY3 else 'strict')
+    return path.path
+
+
+def _journal_decode(cls, text):
+    if cls('')._backend is bytes:
+        return cls(text.encode(sys.getfilesystemencoding(),
+                               'surrogateescape' if PY3 else 'strict'))
+    return cls(text)
+
+
+def _journal_write(fp, entry):
+    if fp is not None:
+        fp.write(unicode(json.dumps(entry, sort_keys=True)) + '\n')
+        fp.flush()
+
+
+def _remove_any(path):
+    if path.is_dir() and not path.is_link():
+        path.rmtree()
+    else:
+        path.remove()
+
+
+def _move_one(kind, src, dst):
+    """Performs one operation of :meth:`~rpaths.Path.bulk_move`.
+
+    A ``'copy'`` goes through a staging name next to `dst`, so that `dst`
+    only appears once complete; the source is removed last.
+    """
+    parent = dst.parent
+    if not parent.is_dir():
+        try:
+            os.makedirs(parent.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not parent.is_dir():
+                raise
+    if kind == 'rename':
+        os.rename(src.path, dst.path)
+        return
+    staging = _move_staging(dst)
+    if staging.lexists():
+        _remove_any(staging)
+    try:
+        if src.is_link():
+            staging.symlink(src.read_link())
+        elif src.is_dir():
+            src.copytree(staging, symlinks=True)
+        else:
+            src.copy(staging)
+            src.copystat(staging)
+        os.rename(staging.path, dst.path)
+    except Exception:
+        if staging.lexists():
+            _remove_any(staging)
+        raise
+    _remove_any(src)
+
+
+def _move_staging(dst):
+    return dst.parent / (dst._to_backend('.') + dst.name +
+                         dst._to_backend('.rpaths-move'))
+
+
+def _move_temp(dst):
+    token = codecs.encode(os.urandom(6), 'hex').decode('ascii')
+    return dst.parent / (dst._to_backend('.') + dst.name +
+                         dst._to_backend('.rpaths-move-%s' % token))
+
+
+def _order_moves(ops, temps=()):
+    """Sorts move operations ``(kind, src, dst)`` into levels.
+
+    An operation comes after the ones moving its destination (or a parent of
+    it) out of the way, after the ones creating a parent of its destination,
+    and before the ones moving a parent of its source. Paths in `temps` don't
+    exist initially: moving one comes after the operation creating it.
+    Returns the levels, as lists of indices in `ops`, and the indices that
+    couldn't be ordered because of cycles.
+    """
+    src_index = dict((src, i) for i, (kind, src, dst) in enumerate(ops))
+    dst_index = dict((dst, i) for i, (kind, src, dst) in enumerate(ops))
+    successors = [[] for op in ops]
+    indegree = [0] * len(ops)
+
+    def edge(before, after):
+        successors[before].append(after)
+        indegree[after] += 1
+
+    def ancestors(path):
+        parent = path.parent
+        while parent != path:
+            yield parent
+            path, parent = parent, parent.parent
+
+    for i, (kind, src, dst) in enumerate(ops):
+        j = src_index.get(dst)
+        if j is not None:
+            if dst in temps:
+                edge(i, j)
+            else:
+                edge(j, i)
+        for ancestor in ancestors(dst):
+            j = src_index.get(ancestor)
+            if j is not None:
+                edge(j, i)
+            j = dst_index.get(ancestor)
+            if j is not None:
+                edge(j, i)
+        for ancestor in ancestors(src):
+            j = src_index.get(ancestor)
+            if j is not None:
+                edge(i, j)
+
+    levels = []
+    level = [i for i in range(len(ops)) if indegree[i] == 0]
+    while level:
+        levels.append(level)
+        next_level = []
+        for i in level:
+            for j in successors[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    next_level.append(j)
+        level = next_level
+    stuck = [i for i in range(len(ops)) if indegree[i] > 0]
+    return levels, stuck
+
+
 class AbstractPath(object):
     """An abstract representation of a path.
 
@@ -461,6 +1085,2221 @@ else:
         DefaultAbstractPath = MacOSPath
 
 
+class FileInfo(object):
+    """Metadata about a file, built from a single stat result.
+
+    This is returned by :meth:`~rpaths.Path.info`. It is a compact object that
+    only keeps the commonly used fields; timestamps are integer numbers of
+    nanoseconds since the epoch. `allocated` is the space used on disk, in
+    bytes (the apparent size on systems that don't report it).
+    """
+    __slots__ = ('is_dir', 'is_file', 'is_link', 'size', 'allocated',
+                 'mtime_ns', 'atime_ns', 'ctime_ns',
+                 'mode', 'inode', 'device', 'nlink')
+
+    def __init__(self, st, is_link=None):
+        """Builds the object from the result of :func:`os.stat`.
+
+        :param is_link: Whether the file is a symbolic link. By default, this
+            is read from the stat result, which is only meaningful if it came
+            from :func:`os.lstat`.
+        """
+        mode = st.st_mode
+        self.is_dir = stat.S_ISDIR(mode)
+        self.is_file = stat.S_ISREG(mode)
+        if is_link is None:
+            is_link = stat.S_ISLNK(mode)
+        self.is_link = is_link
+        self.size = st.st_size
+        blocks = getattr(st, 'st_blocks', None)
+        self.allocated = st.st_size if blocks is None else blocks * 512
+        self.mtime_ns = stat_time_ns(st, 'mtime')
+        self.atime_ns = stat_time_ns(st, 'atime')
+        self.ctime_ns = stat_time_ns(st, 'ctime')
+        self.mode = mode
+        self.inode = st.st_ino
+        self.device = st.st_dev
+        self.nlink = st.st_nlink
+
+    def __repr__(self):
+        return '<%s mode=%o size=%d mtime_ns=%d>' % (
+            self.__class__.__name__, self.mode, self.size, self.mtime_ns)
+
+
+SnapshotEntry = collections.namedtuple('SnapshotEntry',
+                                       ['type', 'size', 'mtime_ns', 'inode'])
+SnapshotDiff = collections.namedtuple(
+    'SnapshotDiff', ['added', 'removed', 'modified', 'moved'])
+
+
+def _snapshot_type(mode):
+    if stat.S_ISLNK(mode):
+        return 'l'
+    elif stat.S_ISDIR(mode):
+        return 'd'
+    elif stat.S_ISREG(mode):
+        return 'f'
+    else:
+        return 'o'
+
+
+class Snapshot(object):
+    """The state of a directory tree at some point in time.
+
+    This is returned by :meth:`~rpaths.Path.snapshot`. It maps relative paths
+    to :class:`SnapshotEntry` tuples ``(type, size, mtime_ns, inode)``, where
+    `type` is ``'f'``, ``'d'``, ``'l'`` or ``'o'`` (for other kinds of files).
+    """
+    def __init__(self, root, entries, children, root_entry):
+        self.root = root
+        self.entries = entries
+        self._children = children
+        self._root_entry = root_entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def __getitem__(self, path):
+        return self.entries[path]
+
+    def diff(self, other):
+        """Compares this snapshot with a more recent one.
+
+        Returns a :class:`SnapshotDiff` tuple ``(added, removed, modified,
+        moved)``, where the first three are sets of relative paths and `moved`
+        is a set of pairs ``(old_path, new_path)``. Moves are detected from
+        inode numbers, for files whose size and modification time didn't
+        change.
+
+        This runs in time linear in the number of entries.
+        """
+        def move_key(entry):
+            if entry.type == 'd':
+                return entry.inode, entry.type
+            else:
+                return entry
+        old_entries = self.entries
+        new_entries = other.entries
+        added = set()
+        modified = set()
+        for path, entry in new_entries.items():
+            old = old_entries.get(path)
+            if old is None:
+                added.add(path)
+            elif old.type != entry.type or old.inode != entry.inode:
+                modified.add(path)
+            elif entry.type != 'd' and old != entry:
+                modified.add(path)
+        removed = set(path for path in old_entries
+                      if path not in new_entries)
+
+        # Pair up removed and added entries with the same inode
+        moved = set()
+        removed_inodes = {}
+        for path in removed:
+            entry = old_entries[path]
+            if entry.inode:
+                removed_inodes[move_key(entry)] = path
+        if removed_inodes:
+            for path in list(added):
+                old_path = removed_inodes.pop(move_key(new_entries[path]),
+                                              None)
+                if old_path is not None:
+                    moved.add((old_path, path))
+                    added.discard(path)
+                    removed.discard(old_path)
+        return SnapshotDiff(added, removed, modified, moved)
+
+
+class TreeIndex(object):
+    """A persistent index of a directory tree, stored in a SQLite database.
+
+    This is returned by :meth:`~rpaths.Path.index`. Queries run against the
+    database instead of the filesystem; use :meth:`refresh` to bring it up to
+    date. Symbolic links are not followed.
+    """
+    def __init__(self, root, db_path):
+        if sqlite3 is None:
+            raise RuntimeError("The sqlite3 module is not available")
+        self.root = root.absolute()
+        self._conn = sqlite3.connect(str(Path(db_path)))
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta('
+                'key TEXT PRIMARY KEY, value BLOB)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries('
+                'path BLOB PRIMARY KEY, parent BLOB, type TEXT, '
+                'size INTEGER, mtime_ns INTEGER, inode INTEGER)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS entries_parent '
+                'ON entries(parent)')
+            root_key = sqlite3.Binary(self._key(self.root))
+            row = self._conn.execute(
+                'SELECT value FROM meta WHERE key = ?', ('root',)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    'INSERT INTO meta(key, value) VALUES(?, ?)',
+                    ('root', root_key))
+        if row is not None and bytes(row[0]) != bytes(root_key):
+            self._conn.close()
+            raise ValueError("Database %s indexes a different directory" %
+                             db_path)
+
+    def close(self):
+        """Closes the database.
+        """
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute(
+            'SELECT COUNT(*) FROM entries WHERE parent IS NOT NULL;'
+        ).fetchone()[0]
+
+    def _key(self, path):
+        """Turns a relative path into the binary, '/'-separated key stored.
+        """
+        path = path.path
+        if path == self.root._to_backend('.'):
+            return b''
+        return self._encode(path)
+
+    def _encode(self, path):
+        if isinstance(path, bytes):
+            return path
+        path = path.replace(self.root._sep, '/')
+        if PY3:
+            return path.encode('utf-8', 'surrogatepass')
+        else:
+            return path.encode('utf-8')
+
+    def _path(self, key):
+        """Turns a key back into an absolute path.
+        """
+        key = bytes(key)
+        if self.root._backend is unicode:
+            if PY3:
+                key = key.decode('utf-8', 'surrogatepass')
+            else:
+                key = key.decode('utf-8')
+        return self.root / key
+
+    @staticmethod
+    def _descendants(key):
+        """Builds a condition selecting the entries under a key.
+        """
+        if not key:
+            return 'parent IS NOT NULL', ()
+        return 'path >= ? AND path < ?', (sqlite3.Binary(key + b'/'),
+                                          sqlite3.Binary(key + b'0'))
+
+    def refresh(self, check_files=False, handle_errors=None):
+        """Updates the index from the filesystem.
+
+        Only the directories whose modification time changed are listed again.
+        Note that modifying a file in place doesn't change the modification
+        time of its directory, so the recorded size and time of that file will
+        not be updated unless `check_files` is True, in which case every file
+        is stat'ed (but still no directory is listed needlessly).
+
+        :param handle_errors: Can be set to a callback that will be called when
+            a directory can't be listed. If set to None (the default),
+            exceptions will be propagated. A directory that couldn't be listed
+            is indexed without its content, and listed again by the next
+            refresh.
+        """
+        conn = self._conn
+        insert = ('INSERT OR REPLACE INTO entries(path, parent, type, size, '
+                  'mtime_ns, inode) VALUES(?, ?, ?, ?, ?, ?)')
+        with conn:
+            st = os.lstat(self.root.path)
+            to_check = [(self.root, b'', None, st)]
+            while to_check:
+                directory, key, parent, st = to_check.pop()
+                bkey = sqlite3.Binary(key)
+                bparent = None if parent is None else sqlite3.Binary(parent)
+                row = (bkey, bparent,
+                       'd', st.st_size, stat_time_ns(st, 'mtime'), st.st_ino)
+                old = conn.execute(
+                    'SELECT mtime_ns, inode FROM entries '
+                    'WHERE path = ? AND type = ?', (bkey, 'd')).fetchone()
+                unchanged = old is not None and tuple(old) == row[4:]
+                known = dict((bytes(k), t) for k, t in conn.execute(
+                    'SELECT path, type FROM entries WHERE parent = ?',
+                    (bkey,)))
+                if unchanged:
+                    # No need to list it again, only check subdirectories
+                    keys = [k for k, t in known.items()
+                            if check_files or t == 'd']
+                else:
+                    try:
+                        names = os.listdir(directory.path)
+                    except OSError:
+                        if handle_errors is not None:
+                            handle_errors(directory.path)
+                            # No modification time, so it gets listed again
+                            conn.execute(insert, row[:4] + (None,) + row[5:])
+                            self._remove_under(key)
+                            continue
+                        raise
+                    conn.execute(insert, row)
+                    prefix = key + b'/' if key else b''
+                    keys = [prefix + self._encode(n) for n in names]
+
+                seen = set()
+                new_rows = []
+                for child_key in keys:
+                    child = self._path(child_key)
+                    try:
+                        st = os.lstat(child.path)
+                    except OSError:
+                        continue
+                    seen.add(child_key)
+                    child_type = _snapshot_type(st.st_mode)
+                    if child_type == 'd':
+                        to_check.append((child, child_key, key, st))
+                    else:
+                        new_rows.append((
+                            sqlite3.Binary(child_key), bkey,
+                            child_type, st.st_size, stat_time_ns(st, 'mtime'),
+                            st.st_ino))
+                        if known.get(child_key) == 'd':
+                            self._remove_under(child_key)
+                conn.executemany(insert, new_rows)
+
+                # Remove entries that are gone
+                for child_key in (keys if unchanged else known):
+                    if child_key not in seen:
+                        conn.execute('DELETE FROM entries WHERE path = ?',
+                                     (sqlite3.Binary(child_key),))
+                        if known[child_key] == 'd':
+                            self._remove_under(child_key)
+
+    def _remove_under(self, key):
+        cond, params = self._descendants(key)
+        self._conn.execute('DELETE FROM entries WHERE ' + cond, params)
+
+    def query(self, pattern=None, prefix=None, type=None, min_size=None,
+              max_size=None, newer_than=None, older_than=None):
+        """Finds paths in the index.
+
+        This returns absolute paths, in order.
+
+        :param pattern: An extended pattern, as accepted by
+            :meth:`~rpaths.Path.recursedir`. Its fixed leading components are
+            used to restrict the search in the database.
+        :type pattern: NoneType | Pattern | unicode | bytes
+
+        :param prefix: Only returns paths that lie under this one, which can be
+            absolute or relative to the indexed directory.
+
+        The other parameters are filters, similar to those of
+        :meth:`~rpaths.Path.recursedir`.
+        """
+        conditions = ['parent IS NOT NULL']
+        params = []
+        full_re = None
+        if pattern is not None:
+            if isinstance(pattern, backend_types):
+                pattern = Pattern(pattern)
+            elif not isinstance(pattern, Pattern):
+                raise TypeError("query() expects pattern to be a Pattern or "
+                                "a string pattern, got %r" % pattern.__class__)
+            full_re = pattern.full_regex
+            if pattern.start_dir:
+                start = self.root.__class__(pattern.start_dir)
+                cond, p = self._descendants(self._key(start))
+                conditions.append('(path = ? OR (%s))' % cond)
+                params.append(sqlite3.Binary(self._key(start)))
+                params.extend(p)
+        if prefix is not None:
+            prefix = self.root.rel_path_to(self.root / prefix)
+            if prefix.path != prefix._to_backend('.'):
+                cond, p = self._descendants(self._key(prefix))
+                conditions.append('(path = ? OR (%s))' % cond)
+                params.append(sqlite3.Binary(self._key(prefix)))
+                params.extend(p)
+        if type is not None:
+            if type not in ('f', 'd', 'l'):
+                raise ValueError("type should be one of 'f', 'd', 'l', got "
+                                 "%r" % type)
+            conditions.append('type = ?')
+            params.append(type)
+        if min_size is not None:
+            conditions.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append('size <= ?')
+            params.append(max_size)
+        now = time.time()
+        for value, op in ((newer_than, '>'), (older_than, '<')):
+            if value is not None:
+                if isinstance(value, datetime.timedelta):
+                    value = now - value.total_seconds()
+                conditions.append('mtime_ns %s ?' % op)
+                params.append(int(value * 1000000000))
+        cursor = self._conn.execute(
+            'SELECT path FROM entries WHERE %s ORDER BY path' %
+            ' AND '.join(conditions),
+            params)
+        for key, in cursor:
+            if full_re is not None:
+                name = bytes(key).decode(
+                    'utf-8' if self.root._backend is unicode
+                    else self.root._encoding,
+                    'replace')
+                if not full_re.search(name):
+                    continue
+            yield self._path(key)
+
+
+WatchEvent = collections.namedtuple('WatchEvent', ['path', 'kind', 'is_dir'])
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_DONT_FOLLOW = 0x2000000
+_IN_EXCL_UNLINK = 0x4000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+                  _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF |
+                  _IN_MOVE_SELF | _IN_ONLYDIR | _IN_DONT_FOLLOW |
+                  _IN_EXCL_UNLINK)
+_inotify_event = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        import ctypes
+        import ctypes.util
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                            use_errno=True)
+    return _libc
+
+
+class _Coroutine(object):
+    """A coroutine awaiting the future returned by a function.
+
+    The function is only called when the coroutine is first run, like the body
+    of an ``async def`` function, which can't be used while this module still
+    supports Python 2.
+    """
+    def __init__(self, func):
+        self._func = func
+        self._future = None
+        self._iter = None
+
+    def __await__(self):
+        return self
+
+    __iter__ = __await__
+
+    def _start(self):
+        if self._iter is None:
+            self._future = self._func()
+            self._iter = self._future.__await__()
+
+    def send(self, value):
+        self._start()
+        return self._iter.send(value)
+
+    def __next__(self):
+        return self.send(None)
+
+    next = __next__
+
+    def throw(self, *args):
+        self._start()
+        try:
+            return self._iter.throw(*args)
+        except BaseException:
+            self._future.cancel()
+            raise
+
+    def close(self):
+        if self._future is not None:
+            self._future.cancel()
+
+
+class Watcher(object):
+    """Watches a directory tree for changes, using Linux's inotify.
+
+    This is returned by :meth:`~rpaths.Path.watch`. Iterating on it (either
+    synchronously or with ``async for``) gives :class:`WatchEvent` tuples
+    ``(path, kind, is_dir)``, where `kind` is one of ``'created'``,
+    ``'deleted'``, ``'modified'``, or ``'overflow'`` if the kernel dropped
+    events (in which case `path` is the root, which should be rescanned).
+    """
+    def __init__(self, root, recursive=True, pattern=None, latency=0.05):
+        import ctypes
+        self.root = root
+        self.recursive = recursive
+        self.latency = latency
+        if pattern is not None and not isinstance(pattern, Pattern):
+            pattern = Pattern(pattern)
+        self.pattern = pattern
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches = {}
+        self._pending = collections.deque()
+        self._add_watches(root, root.__class__(''), False)
+
+    def fileno(self):
+        """The inotify file descriptor, which becomes readable on events.
+        """
+        return self._fd
+
+    def close(self):
+        """Stops watching.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _add_watches(self, directory, rel, report):
+        """Adds watches on a directory and its subdirectories.
+
+        If `report` is True, 'created' events are generated for the entries
+        found, which were created before the watch could be set up.
+        """
+        events = []
+        to_watch = [(directory, rel)]
+        while to_watch:
+            directory, rel = to_watch.pop()
+            # Patterns without a slash can match at any depth
+            if (self.pattern is not None and
+                    self.pattern.int_regex is not None and
+                    rel.path != rel._to_backend('.') and
+                    not self.pattern.may_contain_matches(rel)):
+                continue
+            path = directory.path
+            if not isinstance(path, bytes):
+                path = path.encode(directory._encoding)
+            wd = self._libc.inotify_add_watch(self._fd, path, _IN_WATCH_MASK)
+            if wd < 0:
+                # Directory is gone or unreadable
+                continue
+            self._watches[wd] = directory, rel
+            if not self.recursive:
+                break
+            try:
+                names = os.listdir(directory.path)
+            except OSError:
+                continue
+            for name in names:
+                child = directory / name
+                try:
+                    is_dir = stat.S_ISDIR(os.lstat(child.path).st_mode)
+                except OSError:
+                    continue
+                if report:
+                    events.append((rel / name, child, 'created', is_dir))
+                if is_dir:
+                    to_watch.append((child, rel / name))
+        return events
+
+    def _remove_watches(self, rel):
+        """Removes the watches on a directory and its subdirectories.
+        """
+        for wd, (directory, watched_rel) in list(self._watches.items()):
+            if watched_rel.lies_under(rel):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _read_events(self):
+        """Reads and processes the events currently available.
+
+        Returns a list of ``(rel_path, path, kind, is_dir)``.
+        """
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = _inotify_event.unpack_from(data, pos)
+            pos += _inotify_event.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((self.root.__class__(''), self.root,
+                               'overflow', True))
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            try:
+                directory, rel = self._watches[wd]
+            except KeyError:
+                continue
+            if not name:
+                # Event about the watched directory itself, reported by its
+                # parent unless it's the root
+                if (mask & (_IN_DELETE_SELF | _IN_MOVE_SELF) and
+                        directory is self.root):
+                    events.append((rel, directory, 'deleted', True))
+                continue
+            is_dir = bool(mask & _IN_ISDIR)
+            child_rel = rel / name
+            child = directory / name
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                events.append((child_rel, child, 'created', is_dir))
+                if is_dir and self.recursive:
+                    events.extend(self._add_watches(child, child_rel, True))
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                events.append((child_rel, child, 'deleted', is_dir))
+                if is_dir and mask & _IN_MOVED_FROM:
+                    self._remove_watches(child_rel)
+            elif not is_dir:
+                events.append((child_rel, child, 'modified', is_dir))
+        return events
+
+    def _coalesce(self, events):
+        """Merges the events about each path, and filters with the pattern.
+        """
+        merged = collections.OrderedDict()
+        for rel, path, kind, is_dir in events:
+            if kind == 'overflow':
+                merged[None] = WatchEvent(path, kind, is_dir)
+                continue
+            if (self.pattern is not None and
+                    not self.pattern.matches(rel)):
+                continue
+            previous = merged.get(path)
+            if previous is not None:
+                previous = previous.kind
+                if previous == 'created':
+                    if kind == 'deleted':
+                        del merged[path]
+                        continue
+                    kind = 'created'
+                elif previous == 'deleted' and kind == 'created':
+                    kind = 'modified'
+            merged[path] = WatchEvent(path, kind, is_dir)
+        return list(merged.values())
+
+    def read(self, timeout=None):
+        """Waits for changes and returns a list of events.
+
+        Events arriving within `latency` seconds of the first one are batched
+        together (so a steady stream of events is still returned every
+        `latency` seconds), and the events about a single path are coalesced
+        into one. An empty list is returned if nothing happened before
+        `timeout`.
+        """
+        if self._fd is None:
+            raise ValueError("Watcher is closed")
+        deadline = None if timeout is None else time.time() + timeout
+        events = []
+        flush_at = None
+        while True:
+            if events:
+                wait = max(0, flush_at - time.time())
+            elif deadline is None:
+                wait = None
+            else:
+                wait = max(0, deadline - time.time())
+            if events and wait == 0:
+                readable = []
+            else:
+                readable, _, _ = select.select([self._fd], [], [], wait)
+            if readable:
+                if not events:
+                    flush_at = time.time() + self.latency
+                events.extend(self._read_events())
+                continue
+            if events:
+                # Events might all be filtered out, then keep waiting
+                events = self._coalesce(events)
+                if events:
+                    return events
+            if deadline is not None and time.time() >= deadline:
+                return []
+
+    def __iter__(self):
+        while self._fd is not None:
+            for event in self.read():
+                yield event
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return _Coroutine(self._next_future)
+
+    def _next_future(self):
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        if self._pending:
+            future.set_result(self._pending.popleft())
+            return future
+        elif self._fd is None:
+            future.set_exception(StopAsyncIteration())
+            return future
+        fd = self._fd
+        # Like read(), batch events arriving within `latency` of the first
+        state = {'events': [], 'timer': None}
+
+        def flush():
+            state['timer'] = None
+            self._pending.extend(self._coalesce(state['events']))
+            state['events'] = []
+            if self._pending and not future.done():
+                future.set_result(self._pending.popleft())
+
+        def on_readable():
+            state['events'].extend(self._read_events())
+            if state['timer'] is None:
+                state['timer'] = loop.call_later(self.latency, flush)
+
+        def on_done(f):
+            loop.remove_reader(fd)
+            if state['timer'] is not None:
+                state['timer'].cancel()
+            if state['events']:
+                self._pending.extend(self._coalesce(state['events']))
+
+        loop.add_reader(fd, on_readable)
+        future.add_done_callback(on_done)
+        return future
+
+
+class CopyProgress(collections.namedtuple(
+        'CopyProgress',
+        ['files', 'total_files', 'bytes', 'total_bytes', 'elapsed'])):
+    """Progress of a :meth:`~rpaths.Path.copytree` operation.
+
+    `elapsed` is the number of seconds since the copy of files started.
+    """
+    __slots__ = ()
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+
+SyncSummary = collections.namedtuple(
+    'SyncSummary', ['copied', 'linked', 'deleted', 'unchanged'])
+
+
+class DirHandle(object):
+    """An open directory, relative to which operations can be performed.
+
+    This is returned by :meth:`~rpaths.Path.open_dir`. It holds a file
+    descriptor for the directory, and the methods take names relative to it,
+    using the ``dir_fd`` parameters of the :mod:`os` functions. Contrary to
+    :meth:`~rpaths.Path.in_dir`, this doesn't change the process-wide current
+    directory and is thread-safe; it also avoids resolving the full path of
+    the directory on each operation.
+    """
+    def __init__(self, path, fd):
+        self.path = path
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        """Closes the directory descriptor.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __repr__(self):
+        return '<%s %r fd=%r>' % (self.__class__.__name__, self.path,
+                                  self.fd)
+
+    def _name(self, name):
+        return self.path._to_backend(name)
+
+    def stat(self, name, follow_links=True):
+        """Returns the stat result of an entry in this directory.
+        """
+        return os.stat(self._name(name), dir_fd=self.fd,
+                       follow_symlinks=follow_links)
+
+    def info(self, name, follow_links=True):
+        """Returns a :class:`~rpaths.FileInfo` for an entry in this directory.
+        """
+        st = os.stat(self._name(name), dir_fd=self.fd, follow_symlinks=False)
+        if follow_links and stat.S_ISLNK(st.st_mode):
+            return FileInfo(self.stat(name), is_link=True)
+        return FileInfo(st)
+
+    def listdir(self):
+        """Returns the names of the entries in this directory.
+
+        Contrary to :meth:`~rpaths.Path.listdir`, these are relative paths
+        made of a single component.
+        """
+        return [self.path.__class__(n) for n in os.listdir(self.fd)]
+
+    def open(self, name, mode='r', **kwargs):
+        """Opens a file in this directory.
+
+        Arguments are as for :func:`io.open`.
+        """
+        return io.open(self._name(name), mode,
+                       opener=lambda p, flags: os.open(p, flags, 0o666,
+                                                       dir_fd=self.fd),
+                       **kwargs)
+
+    def open_dir(self, name):
+        """Opens a subdirectory, returning a new :class:`DirHandle`.
+        """
+        fd = os.open(self._name(name),
+                     os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0),
+                     dir_fd=self.fd)
+        return self.__class__(self.path / name, fd)
+
+    def mkdir(self, name, mode=0o777):
+        """Creates a subdirectory.
+        """
+        os.mkdir(self._name(name), mode, dir_fd=self.fd)
+
+    def remove(self, name):
+        """Removes a file from this directory.
+        """
+        os.unlink(self._name(name), dir_fd=self.fd)
+
+    def rmdir(self, name):
+        """Removes an empty subdirectory.
+        """
+        os.rmdir(self._name(name), dir_fd=self.fd)
+
+    def rename(self, name, new, target_dir=None):
+        """Renames an entry of this directory.
+
+        :param target_dir: Another :class:`DirHandle` to which `new` is
+            relative. By default, it is this directory.
+        """
+        if target_dir is None:
+            target_dir = self
+        os.rename(self._name(name), target_dir._name(new),
+                  src_dir_fd=self.fd, dst_dir_fd=target_dir.fd)
+
+    def symlink(self, name, target):
+        """Creates a symbolic link in this directory, pointing to `target`.
+        """
+        os.symlink(self._name(target), self._name(name), dir_fd=self.fd)
+
+
+class HashCache(object):
+    """A persistent cache of file digests, stored in a SQLite database.
+
+    Digests are keyed on the device, inode, size and modification time of the
+    file: as long as these don't change, the file is not read again. This can
+    be passed to :meth:`~rpaths.Path.hash` and related methods, and is safe to
+    use from multiple threads.
+
+    The digests of directories (see :meth:`~rpaths.Path.hash_tree`) are
+    keyed on their device and inode, and a fingerprint of their entries.
+    """
+    def __init__(self, db_path):
+        if sqlite3 is None:
+            raise RuntimeError("The sqlite3 module is not available")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(Path(db_path)),
+                                     check_same_thread=False)
+        self._pending = 0
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS digests('
+                'device INTEGER, inode INTEGER, algorithm TEXT, '
+                'size INTEGER, mtime_ns INTEGER, digest BLOB, '
+                'PRIMARY KEY(device, inode, algorithm))')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS directories('
+                'device INTEGER, inode INTEGER, algorithm TEXT, '
+                'fingerprint BLOB, digest BLOB, '
+                'PRIMARY KEY(device, inode, algorithm))')
+
+    @staticmethod
+    def _key(st, algorithm):
+        # SQLite integers are signed 64-bit
+        return (st.st_dev - (1 << 64) if st.st_dev >= 1 << 63 else st.st_dev,
+                st.st_ino - (1 << 64) if st.st_ino >= 1 << 63 else st.st_ino,
+                algorithm)
+
+    def get(self, st, algorithm):
+        """Gets the digest for a file from its stat result, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest FROM digests WHERE device = ? AND inode = ? '
+                'AND algorithm = ? AND size = ? AND mtime_ns = ?',
+                self._key(st, algorithm) +
+                (st.st_size, stat_time_ns(st, 'mtime'))).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0])
+
+    def set(self, st, algorithm, digest):
+        """Records the digest for a file with the given stat result.
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO digests(device, inode, algorithm, '
+                'size, mtime_ns, digest) VALUES(?, ?, ?, ?, ?, ?)',
+                self._key(st, algorithm) +
+                (st.st_size, stat_time_ns(st, 'mtime'),
+                 sqlite3.Binary(digest)))
+            self._pending += 1
+            if self._pending >= 1000:
+                self._conn.commit()
+                self._pending = 0
+
+    def get_directory(self, st, algorithm, fingerprint):
+        """Gets the digest for a directory from its stat result and the
+        fingerprint of its entries, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest FROM directories WHERE device = ? AND '
+                'inode = ? AND algorithm = ? AND fingerprint = ?',
+                self._key(st, algorithm) +
+                (sqlite3.Binary(fingerprint),)).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0])
+
+    def set_directory(self, st, algorithm, fingerprint, digest):
+        """Records the digest for a directory with the given stat result and
+        fingerprint.
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO directories(device, inode, algorithm, '
+                'fingerprint, digest) VALUES(?, ?, ?, ?, ?)',
+                self._key(st, algorithm) +
+                (sqlite3.Binary(fingerprint), sqlite3.Binary(digest)))
+            self._pending += 1
+            if self._pending >= 1000:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        """Writes the pending changes to disk.
+        """
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        """Writes the pending changes and closes the database.
+        """
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def _syncfs(fd):
+    """Flushes the whole filesystem containing `fd`, returns False if we can't.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import ctypes
+    libc = _load_libc()
+    if not hasattr(libc, 'syncfs'):
+        return False
+    if libc.syncfs(fd) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return True
+
+
+class BatchWriter(object):
+    """Writes many files atomically, sharing the cost of flushing them.
+
+    This is returned by :meth:`~rpaths.Path.batch_writer`. Files opened with
+    :meth:`open` are written to temporary files; when the batch is committed
+    (at the end of the ``with`` block), their data is flushed to disk, they are
+    all renamed into place, then each parent directory is flushed once. If an
+    exception is raised, the temporary files are removed and no target is
+    modified.
+
+    `sync` is one of:
+
+    * ``'auto'`` (the default): uses ``syncfs()`` once per filesystem if
+      available (on Linux), else ``fsync()`` on each file
+    * ``'syncfs'``: same, but raises if ``syncfs()`` is not available
+    * ``'fsync'``: ``fsync()`` on each file
+    * ``'none'``: doesn't flush anything, only the atomic renames happen
+    """
+    def __init__(self, sync='auto'):
+        if sync not in ('auto', 'syncfs', 'fsync', 'none'):
+            raise ValueError("sync should be 'auto', 'syncfs', 'fsync' or "
+                             "'none', got %r" % sync)
+        self.sync = sync
+        self._files = collections.OrderedDict()
+
+    def open(self, path, mode='w', **kwargs):
+        """Opens a file that will replace `path` when the batch is committed.
+
+        Keyword arguments are passed to :func:`io.open`. The permissions of
+        the file being replaced are kept.
+        """
+        target = Path(path).absolute()
+        for m in 'war+x':
+            mode = mode.replace(m, '')
+        fd, temp = _create_temp_sibling(target)
+        try:
+            try:
+                previous_mode = stat.S_IMODE(os.stat(target.path).st_mode)
+            except OSError:
+                pass
+            else:
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(fd, previous_mode)
+                else:
+                    os.chmod(temp.path, previous_mode)
+            fp = io.open(fd, 'w' + mode, **kwargs)
+        except Exception:
+            os.close(fd)
+            temp.remove()
+            raise
+        previous = self._files.pop(target, None)
+        if previous is not None:
+            previous[0].close()
+            previous[1].remove()
+        self._files[target] = fp, temp
+        return fp
+
+    def _sync_data(self):
+        if self.sync != 'fsync':
+            devices = {}
+            for target, (fp, temp) in self._files.items():
+                devices.setdefault(os.stat(temp.path).st_dev, target.parent)
+            for directory in list(devices.values()):
+                fd = os.open(directory.path, os.O_RDONLY)
+                try:
+                    if not _syncfs(fd):
+                        break
+                finally:
+                    os.close(fd)
+            else:
+                return
+            if self.sync == 'syncfs':
+                raise RuntimeError("syncfs() is not available")
+        for fp, temp in self._files.values():
+            # Windows needs a writable descriptor to flush a file
+            if os.name == 'nt':
+                fd = os.open(temp.path, os.O_RDWR | os.O_BINARY)
+            else:
+                fd = os.open(temp.path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def commit(self):
+        """Flushes and renames all the files into place.
+
+        This is called automatically at the end of the ``with`` block.
+        """
+        try:
+            for fp, temp in self._files.values():
+                fp.close()
+            if self.sync != 'none':
+                self._sync_data()
+            directories = set()
+            while self._files:
+                target, (fp, temp) = self._files.popitem(last=False)
+                try:
+                    _replace(temp.path, target.path)
+                except Exception:
+                    temp.remove()
+                    raise
+                directories.add(target.parent)
+            if self.sync != 'none':
+                for directory in directories:
+                    _fsync_dir(directory.path)
+        finally:
+            self.abort()
+
+    def abort(self):
+        """Removes the temporary files without modifying the targets.
+        """
+        while self._files:
+            target, (fp, temp) = self._files.popitem()
+            fp.close()
+            try:
+                temp.remove()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class ExecutorStats(collections.namedtuple(
+        'ExecutorStats',
+        ['workers', 'queued', 'running', 'completed', 'max_queued'])):
+    """Metrics of an :class:`~rpaths.AsyncExecutor`.
+
+    `queued` is the number of calls waiting for a thread (the queue depth),
+    `max_queued` is the highest it has been.
+    """
+    __slots__ = ()
+
+
+class AsyncExecutor(object):
+    """A pool of threads running the blocking calls of the asynchronous API.
+
+    The ``a*`` methods of :class:`~rpaths.Path` (:meth:`~rpaths.Path.aopen`,
+    :meth:`~rpaths.Path.astat`, ...) use the default executor unless one is
+    passed explicitly. It has 8 threads; use :meth:`set_default` to change
+    it, and :meth:`stats` to see whether calls are waiting for a thread.
+
+    It is separate from the event loop's default executor, so filesystem calls
+    don't delay (and aren't delayed by) other blocking calls, such as DNS
+    lookups.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, workers=8):
+        if futures is None:
+            raise RuntimeError("The concurrent.futures module is not "
+                               "available")
+        self.workers = workers
+        self._executor = futures.ThreadPoolExecutor(workers)
+        self._lock = threading.Lock()
+        self._queued = self._running = self._completed = 0
+        self._max_queued = 0
+
+    @classmethod
+    def get_default(cls):
+        """Returns the default executor, creating it if needed.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @classmethod
+    def set_default(cls, executor):
+        """Replaces the default executor, returns the previous one (or None).
+
+        The previous executor is not shut down.
+        """
+        with cls._default_lock:
+            previous, cls._default = cls._default, executor
+            return previous
+
+    def stats(self):
+        """Returns an :class:`~rpaths.ExecutorStats` for this executor.
+        """
+        with self._lock:
+            return ExecutorStats(self.workers, self._queued, self._running,
+                                 self._completed, self._max_queued)
+
+    def submit(self, func, *args, **kwargs):
+        """Calls a function in a thread, returns a
+        :class:`concurrent.futures.Future`.
+        """
+        def call():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        def on_done(future):
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            future = self._executor.submit(call)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(on_done)
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Calls a function in a thread, returns an :class:`asyncio.Future`.
+
+        Cancelling the future cancels the call if it hasn't started yet.
+        """
+        import asyncio
+
+        return asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+
+
+def _advance(steps):
+    try:
+        return False, next(steps)
+    except StopIteration:
+        return True, None
+
+
+def _run_steps(executor, steps):
+    """Runs a generator on the executor, one step at a time.
+
+    Each ``next()`` call happens in a thread; the event loop gets control back
+    between steps. Returns an :class:`asyncio.Future` for the last value
+    yielded by the generator. Cancelling it stops after the current step and
+    closes the generator (so its ``with`` and ``finally`` blocks run).
+    """
+    import asyncio
+
+    result = asyncio.get_event_loop().create_future()
+    state = {'last': None, 'current': None}
+
+    def schedule():
+        current = state['current'] = executor.submit(_advance, steps)
+        asyncio.wrap_future(current).add_done_callback(on_step)
+
+    def on_step(inner):
+        if result.done():
+            # Cancelled; the generator is not running anymore at this point
+            executor.submit(steps.close)
+        elif inner.cancelled():
+            result.cancel()
+            executor.submit(steps.close)
+        elif inner.exception() is not None:
+            result.set_exception(inner.exception())
+        else:
+            finished, value = inner.result()
+            if finished:
+                result.set_result(state['last'])
+            else:
+                state['last'] = value
+                schedule()
+
+    def on_result(future):
+        if future.cancelled():
+            state['current'].cancel()
+
+    result.add_done_callback(on_result)
+    schedule()
+    return result
+
+
+class AsyncFile(object):
+    """A file object whose methods return :class:`asyncio.Future` objects.
+
+    This is returned by :meth:`~rpaths.Path.aopen`; awaiting it (or entering
+    it with ``async with``) waits for the file to be opened. Operations run on
+    an :class:`~rpaths.AsyncExecutor`, one at a time and in the order they
+    were issued, so it's not necessary to await each write before issuing the
+    next one. Iterating on it with ``async for`` gives chunks of
+    `chunk_size` (bytes or characters).
+    """
+    def __init__(self, opener, executor, chunk_size=COPY_BUFFER_SIZE):
+        import asyncio
+
+        self._executor = executor
+        self.chunk_size = chunk_size
+        self._fp = None
+        self._last = asyncio.get_event_loop().create_future()
+        self._last.set_result(None)
+        self._opened = self._then(self._open, opener)
+
+    def _open(self, opener):
+        self._fp = opener()
+        return self
+
+    def _file(self):
+        if self._fp is None:
+            raise ValueError("File could not be opened")
+        return self._fp
+
+    def _then(self, func, *args):
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+        # Separate from result, which can be cancelled while the call runs
+        finished = loop.create_future()
+
+        def start(previous):
+            if result.cancelled():
+                finished.set_result(None)
+                return
+            inner = self._executor.run(func, *args)
+
+            def done(inner):
+                finished.set_result(None)
+                if result.cancelled():
+                    return
+                elif inner.cancelled():
+                    result.cancel()
+                elif inner.exception() is not None:
+                    result.set_exception(inner.exception())
+                else:
+                    result.set_result(inner.result())
+
+            inner.add_done_callback(done)
+
+        self._last.add_done_callback(start)
+        self._last = finished
+        return result
+
+    def read(self, size=-1):
+        return self._then(lambda: self._file().read(size))
+
+    def write(self, data):
+        return self._then(lambda: self._file().write(data))
+
+    def seek(self, offset, whence=0):
+        return self._then(lambda: self._file().seek(offset, whence))
+
+    def tell(self):
+        return self._then(lambda: self._file().tell())
+
+    def flush(self):
+        return self._then(lambda: self._file().flush())
+
+    def close(self):
+        return self._then(lambda: self._fp is not None and self._fp.close())
+
+    def __await__(self):
+        return self._opened.__await__()
+
+    def __aenter__(self):
+        return self._opened
+
+    def __aexit__(self, exc_type, exc_value, tb):
+        return self.close()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        def read_chunk():
+            chunk = self._file().read(self.chunk_size)
+            if not chunk:
+                raise StopAsyncIteration()
+            return chunk
+
+        return self._then(read_chunk)
+
+
+class TempDirPool(object):
+    """A pool of scratch directories that are emptied and reused.
+
+    :meth:`scratch` gives an empty temporary directory; when it is done with,
+    its content is removed and the directory goes back into the pool instead
+    of being deleted, saving the creation and removal of a directory for each
+    use. Directories that can't be emptied are deleted instead. Closing the
+    pool (or leaving its ``with`` block) deletes all the directories.
+
+    Arguments are as for :meth:`~rpaths.Path.tempdir`; `size` is the maximum
+    number of idle directories kept in the pool. This is safe to use from
+    multiple threads.
+    """
+    def __init__(self, size=16, suffix='', prefix=None, dir=None):
+        self.size = size
+        self._tempdir_args = suffix, prefix, dir
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self):
+        """Returns an empty directory, which should be given back with
+        :meth:`release`.
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("Pool is closed")
+            if self._idle:
+                return self._idle.pop()
+        return Path.tempdir(*self._tempdir_args)
+
+    def release(self, directory):
+        """Empties a directory and puts it back into the pool.
+        """
+        directory = Path(directory)
+        try:
+            directory.chmod(0o700)
+            if DIR_FD_SUPPORTED:
+                errors = []
+                fd = os.open(directory.path, _O_DIR_NOFOLLOW)
+                try:
+                    _rmtree_fd(fd, errors.append)
+                finally:
+                    os.close(fd)
+                if errors:
+                    raise errors[0]
+            else:
+                for child in directory.listdir():
+                    if child.is_dir() and not child.is_link():
+                        child.rmtree()
+                    else:
+                        child.remove()
+        except OSError:
+            directory.rmtree(ignore_errors=True)
+            return
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(directory)
+                return
+        directory.rmtree(ignore_errors=True)
+
+    @contextlib.contextmanager
+    def scratch(self):
+        """Context manager giving an empty directory, recycled at the end.
+        """
+        directory = self.acquire()
+        try:
+            yield directory
+        finally:
+            self.release(directory)
+
+    def close(self):
+        """Deletes the idle directories; released ones will be deleted too.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for directory in idle:
+            directory.rmtree(ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class FileSystem(object):
+    """Base class for the filesystems that :class:`~rpaths.Path` operates on.
+
+    The concrete operations of :class:`~rpaths.Path` go through the `_fs`
+    attribute of its class, an instance of this. The methods mirror the
+    functions of :mod:`os` and :mod:`shutil`, and take paths in the backend
+    representation of the path class (``Path(...).path``).
+
+    Subclasses need to implement the methods raising
+    :exc:`NotImplementedError`; the others have generic implementations built
+    on top of them.
+    """
+    #: Whether paths are real paths of the operating system, that can be
+    #: passed to :mod:`os` functions directly.
+    native = False
+
+    _lib = os.path
+
+    def getcwd(self):
+        raise NotImplementedError
+
+    def chdir(self, path):
+        raise NotImplementedError
+
+    def abspath(self, path):
+        raise NotImplementedError
+
+    def realpath(self, path):
+        raise NotImplementedError
+
+    def stat(self, path):
+        raise NotImplementedError
+
+    def lstat(self, path):
+        raise NotImplementedError
+
+    def listdir(self, path):
+        raise NotImplementedError
+
+    def mkdir(self, path, mode=0o777):
+        raise NotImplementedError
+
+    def rmdir(self, path):
+        raise NotImplementedError
+
+    def unlink(self, path):
+        raise NotImplementedError
+
+    def rename(self, src, dst):
+        raise NotImplementedError
+
+    def symlink(self, target, path):
+        raise NotImplementedError
+
+    def readlink(self, path):
+        raise NotImplementedError
+
+    def chmod(self, path, mode):
+        raise NotImplementedError
+
+    def utime(self, path, ns):
+        """Sets the access and modification times, in nanoseconds.
+        """
+        raise NotImplementedError
+
+    def open(self, path, mode='r', **kwargs):
+        raise NotImplementedError
+
+    def mkdtemp(self, suffix='', prefix=None, dir=None):
+        raise NotImplementedError
+
+    def mkstemp(self, suffix='', prefix=None, dir=None, text=False):
+        """Creates a temporary file, returns ``(fd, path)``.
+        """
+        raise NotImplementedError
+
+    def _test(self, path, func, follow_links=True):
+        try:
+            st = self.stat(path) if follow_links else self.lstat(path)
+        except OSError:
+            return False
+        return func is None or func(st.st_mode)
+
+    def exists(self, path):
+        return self._test(path, None)
+
+    def lexists(self, path):
+        return self._test(path, None, False)
+
+    def isfile(self, path):
+        return self._test(path, stat.S_ISREG)
+
+    def isdir(self, path):
+        return self._test(path, stat.S_ISDIR)
+
+    def islink(self, path):
+        return self._test(path, stat.S_ISLNK, False)
+
+    def ismount(self, path):
+        try:
+            st = self.lstat(path)
+            pardir = b'..' if isinstance(path, bytes) else '..'
+            parent = self.lstat(self._lib.join(path, pardir))
+        except OSError:
+            return False
+        if stat.S_ISLNK(st.st_mode):
+            return False
+        return st.st_dev != parent.st_dev or st.st_ino == parent.st_ino
+
+    def samefile(self, path1, path2):
+        st1 = self.stat(path1)
+        st2 = self.stat(path2)
+        return st1.st_ino == st2.st_ino and st1.st_dev == st2.st_dev
+
+    def _split(self, path):
+        head, tail = self._lib.split(path)
+        if not tail:
+            head, tail = self._lib.split(head)
+        return head, tail
+
+    def makedirs(self, path, mode=0o777):
+        head, tail = self._split(path)
+        if head and tail and not self.exists(head):
+            try:
+                self.makedirs(head, mode)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        self.mkdir(path, mode)
+
+    def removedirs(self, path):
+        self.rmdir(path)
+        head, tail = self._split(path)
+        while head and tail:
+            try:
+                self.rmdir(head)
+            except OSError:
+                break
+            head, tail = self._split(head)
+
+    def renames(self, src, dst):
+        head, tail = self._split(dst)
+        if head and tail and not self.exists(head):
+            self.makedirs(head)
+        self.rename(src, dst)
+        head, tail = self._split(src)
+        if head and tail:
+            try:
+                self.removedirs(head)
+            except OSError:
+                pass
+
+    def move(self, src, dst):
+        if self.isdir(dst):
+            dst = self._lib.join(dst, self._split(src)[1])
+        self.rename(src, dst)
+
+    def copyfile(self, src, dst, strategy=None, sparse=False):
+        """Copies a file's content, returns the name of the strategy used.
+        """
+        with self.open(src, 'rb') as fsrc:
+            with self.open(dst, 'wb') as fdst:
+                shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+        return 'copyfileobj'
+
+    def copymode(self, src, dst):
+        self.chmod(dst, stat.S_IMODE(self.stat(src).st_mode))
+
+    def copystat(self, src, dst):
+        st = self.stat(src)
+        self.utime(dst, (stat_time_ns(st, 'atime'), stat_time_ns(st, 'mtime')))
+        self.chmod(dst, stat.S_IMODE(st.st_mode))
+
+    def rmtree(self, path, ignore_errors=False):
+        try:
+            if stat.S_ISLNK(self.lstat(path).st_mode):
+                raise OSError("Cannot call rmtree on a symbolic link")
+            names = self.listdir(path)
+        except OSError:
+            if ignore_errors:
+                return
+            raise
+        for name in names:
+            child = self._lib.join(path, name)
+            try:
+                is_dir = stat.S_ISDIR(self.lstat(child).st_mode)
+            except OSError:
+                is_dir = False
+            try:
+                if is_dir:
+                    self.rmtree(child, ignore_errors)
+                else:
+                    self.unlink(child)
+            except OSError:
+                if not ignore_errors:
+                    raise
+        try:
+            self.rmdir(path)
+        except OSError:
+            if not ignore_errors:
+                raise
+
+
+class OSFileSystem(FileSystem):
+    """The filesystem of the operating system, used by default.
+    """
+    native = True
+
+    def getcwd(self):
+        return os.getcwd()
+
+    def chdir(self, path):
+        os.chdir(path)
+
+    def abspath(self, path):
+        return os.path.abspath(path)
+
+    def realpath(self, path):
+        return os.path.realpath(path)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def lstat(self, path):
+        return os.lstat(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def mkdir(self, path, mode=0o777):
+        os.mkdir(path, mode)
+
+    def makedirs(self, path, mode=0o777):
+        os.makedirs(path, mode)
+
+    def rmdir(self, path):
+        os.rmdir(path)
+
+    def removedirs(self, path):
+        os.removedirs(path)
+
+    def unlink(self, path):
+        os.remove(path)
+
+    def rename(self, src, dst):
+        os.rename(src, dst)
+
+    def renames(self, src, dst):
+        os.renames(src, dst)
+
+    def move(self, src, dst):
+        shutil.move(src, dst)
+
+    def symlink(self, target, path):
+        os.symlink(target, path)
+
+    def readlink(self, path):
+        return os.readlink(path)
+
+    def chmod(self, path, mode):
+        os.chmod(path, mode)
+
+    def utime(self, path, ns):
+        if PY3:
+            os.utime(path, ns=ns)
+        else:
+            os.utime(path, (ns[0] / 1e9, ns[1] / 1e9))
+
+    def open(self, path, mode='r', **kwargs):
+        return io.open(path, mode=mode, **kwargs)
+
+    def mkdtemp(self, suffix='', prefix=None, dir=None):
+        if prefix is None:
+            prefix = tempfile.template
+        return tempfile.mkdtemp(suffix, prefix, dir)
+
+    def mkstemp(self, suffix='', prefix=None, dir=None, text=False):
+        if prefix is None:
+            prefix = tempfile.template
+        return tempfile.mkstemp(suffix, prefix, dir, text)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def lexists(self, path):
+        return os.path.lexists(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def islink(self, path):
+        return os.path.islink(path)
+
+    def ismount(self, path):
+        return os.path.ismount(path)
+
+    if hasattr(os.path, 'samefile'):
+        def samefile(self, path1, path2):
+            return os.path.samefile(path1, path2)
+
+    def copyfile(self, src, dst, strategy=None, sparse=False):
+        return copy_file_contents(src, dst, strategy, sparse)
+
+    def copymode(self, src, dst):
+        shutil.copymode(src, dst)
+
+    def copystat(self, src, dst):
+        shutil.copystat(src, dst)
+
+    def rmtree(self, path, ignore_errors=False):
+        shutil.rmtree(path, ignore_errors)
+
+
+def _now_ns():
+    return int(time.time() * 1000000000)
+
+
+class _MemoryNode(object):
+    __slots__ = ('kind', 'mode', 'ino', 'data', 'entries', 'target',
+                 'atime_ns', 'mtime_ns', 'ctime_ns')
+
+    def __init__(self, kind, mode, ino):
+        self.kind = kind
+        self.mode = mode
+        self.ino = ino
+        self.data = b''
+        self.entries = collections.OrderedDict() if kind == 'd' else None
+        self.target = None
+        self.atime_ns = self.mtime_ns = self.ctime_ns = _now_ns()
+
+
+class _MemoryFile(io.BytesIO):
+    """A file opened on a :class:`~rpaths.MemoryFS`.
+
+    The content is written back to the filesystem when flushed or closed.
+    """
+    def __init__(self, fs, node, name, readable, writable, append):
+        io.BytesIO.__init__(self, node.data)
+        self.name = name
+        self._fs = fs
+        self._node = node
+        self._readable = readable
+        self._writable = writable
+        self._append = append
+        self._dirty = False
+        if append:
+            self.seek(0, 2)
+
+    def readable(self):
+        return self._readable
+
+    def writable(self):
+        return self._writable
+
+    def _check_writable(self):
+        if not self._writable:
+            raise io.UnsupportedOperation("File not open for writing")
+
+    def read(self, size=-1):
+        if not self._readable:
+            raise io.UnsupportedOperation("File not open for reading")
+        return io.BytesIO.read(self, size)
+
+    def readinto(self, buffer):
+        if not self._readable:
+            raise io.UnsupportedOperation("File not open for reading")
+        return io.BytesIO.readinto(self, buffer)
+
+    def write(self, data):
+        self._check_writable()
+        if self._append:
+            self.seek(0, 2)
+        self._dirty = True
+        return io.BytesIO.write(self, data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def truncate(self, size=None):
+        self._check_writable()
+        self._dirty = True
+        return io.BytesIO.truncate(self, size)
+
+    def flush(self):
+        io.BytesIO.flush(self)
+        if self._dirty:
+            self._fs._store(self._node, self.getvalue())
+            self._dirty = False
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.flush()
+            finally:
+                io.BytesIO.close(self)
+
+
+def _native_only(name):
+    def method(*args, **kwargs):
+        raise NotImplementedError("%s() is only supported on the operating "
+                                  "system's filesystem" % name)
+    method.__name__ = str(name)
+    return staticmethod(method)
+
+
+class MemoryFS(FileSystem):
+    """A filesystem that lives entirely in memory.
+
+    Its :attr:`Path` attribute is a subclass of :class:`~rpaths.Path` whose
+    operations happen on this filesystem instead of the disk, which makes
+    tests and dry runs much faster::
+
+        fs = MemoryFS()
+        tmp = fs.Path.tempdir()
+        (tmp / 'dir').mkdir()
+        with (tmp / 'dir/file').open('w') as fp:
+            fp.write('hello')
+        list(tmp.recursedir())
+
+    Files, directories and symbolic links are supported, with modes and
+    timestamps; :meth:`~rpaths.Path.stat` returns a regular
+    :class:`os.stat_result`. The supported methods are listed in
+    :attr:`SUPPORTED`; the other concrete methods of :class:`~rpaths.Path`
+    (which need real file descriptors, like :meth:`~rpaths.Path.mmap`, or
+    are built on the :mod:`os` module directly, like
+    :meth:`~rpaths.Path.sync_to`) raise :exc:`NotImplementedError`.
+    :meth:`~rpaths.Path.tempfile` returns an open file object instead of a
+    descriptor, since memory files have none.
+
+    Some simplifications: ``..`` is resolved lexically (before symbolic
+    links), there are no hard links or owners, permissions are recorded but
+    not enforced, and files opened several times at once don't see each
+    other's writes until they are closed.
+
+    :param listing_order: The order in which
+        :meth:`~rpaths.Path.listdir` returns entries: ``'created'`` (the
+        default), ``'sorted'``, or ``'reversed'`` (reverse creation order,
+        useful to catch code depending on the order of entries).
+
+    :param umask: Removed from the permissions of new files and directories.
+
+    This is safe to use from multiple threads.
+    """
+    SUPPORTED = frozenset([
+        'cwd', 'chdir', 'in_dir', 'tempdir', 'absolute', 'rel_path_to',
+        'relative', 'resolve', 'listdir', 'recursedir', 'exists', 'lexists',
+        'is_file', 'is_dir', 'is_link', 'atime', 'ctime', 'mtime', 'size',
+        'stat', 'lstat', 'stat_many', 'info', 'chmod', 'mkdir', 'rmdir',
+        'remove', 'rename', 'symlink', 'read_link', 'copyfile', 'copymode',
+        'copystat', 'copy', 'rmtree', 'move', 'open', 'iter_chunks',
+        'read_bytes', 'read_text', 'tempfile', 'copytree', 'mkdirs',
+        'is_mount', 'same_file'])
+
+    def __init__(self, listing_order='created', umask=0o022):
+        if listing_order not in ('created', 'sorted', 'reversed'):
+            raise ValueError("listing_order should be 'created', 'sorted' or "
+                             "'reversed', got %r" % listing_order)
+        self.listing_order = listing_order
+        self.umask = umask
+        self.device = id(self) & 0xffffffff
+        self._lock = threading.RLock()
+        self._next_ino = 1
+        self._roots = {}
+
+        namespace = {'_fs': self, '__module__': __name__}
+        for name, attr in vars(Path).items():
+            if (not name.startswith('_') and name not in self.SUPPORTED and
+                    (callable(attr) or
+                     isinstance(attr, (staticmethod, classmethod)))):
+                namespace[name] = _native_only(name)
+        #: The :class:`~rpaths.Path` subclass operating on this filesystem.
+        self.Path = type(str('MemoryPath'), (Path,), namespace)
+        self._lib = self.Path._lib
+        self._cwd = self.Path(self._lib.sep).path
+        self._tmp = self.Path(self._lib.sep, 'tmp').path
+
+    def _error(self, code, path):
+        return OSError(code, os.strerror(code), path)
+
+    def _new_node(self, kind, mode):
+        node = _MemoryNode(kind, mode & ~self.umask & 0o7777, self._next_ino)
+        self._next_ino += 1
+        return node
+
+    def _walk(self, path, follow_last=True, hops=0):
+        """Looks up a path.
+
+        Returns ``(parent, name, node, full_path)``, where `node` is None if
+        the last component doesn't exist (and `parent` is None for a root).
+        Symbolic links are followed, except for the last component if
+        `follow_last` is False.
+        """
+        lib = self._lib
+        full = lib.normpath(lib.join(self._cwd, path))
+        drive, rest = lib.splitdrive(full)
+        sep = lib.sep if isinstance(full, unicode) else lib.sep.encode('ascii')
+        parts = [p for p in rest.split(sep) if p]
+        root = self._roots.get(lib.normcase(drive))
+        if root is None:
+            root = self._roots[lib.normcase(drive)] = self._new_node('d',
+                                                                     0o755)
+        parent = name = None
+        node = root
+        current = drive + sep
+        for i, part in enumerate(parts):
+            if node.kind != 'd':
+                raise self._error(errno.ENOTDIR, path)
+            child = node.entries.get(part)
+            last = i == len(parts) - 1
+            if (child is not None and child.kind == 'l' and
+                    (follow_last or not last)):
+                if hops >= 40:
+                    raise self._error(errno.ELOOP, path)
+                target = lib.join(current, child.target)
+                if not last:
+                    target = lib.join(target, *parts[i + 1:])
+                return self._walk(target, follow_last, hops + 1)
+            elif child is None and not last:
+                raise self._error(errno.ENOENT, path)
+            parent, name, node = node, part, child
+            current = lib.join(current, part)
+        return parent, name, node, current
+
+    def _get(self, path, follow_last=True):
+        parent, name, node, full = self._walk(path, follow_last)
+        if node is None:
+            raise self._error(errno.ENOENT, path)
+        return node
+
+    def _create(self, path, kind, mode):
+        parent, name, node, full = self._walk(path, False)
+        if node is not None:
+            raise self._error(errno.EEXIST, path)
+        node = self._new_node(kind, mode)
+        parent.entries[name] = node
+        parent.mtime_ns = parent.ctime_ns = node.ctime_ns
+        return node
+
+    def _store(self, node, data):
+        with self._lock:
+            node.data = data
+            node.mtime_ns = node.ctime_ns = _now_ns()
+
+    def getcwd(self):
+        return self._cwd
+
+    def chdir(self, path):
+        with self._lock:
+            parent, name, node, full = self._walk(path)
+            if node is None:
+                raise self._error(errno.ENOENT, path)
+            elif node.kind != 'd':
+                raise self._error(errno.ENOTDIR, path)
+            self._cwd = full
+
+    def abspath(self, path):
+        return self._lib.normpath(self._lib.join(self._cwd, path))
+
+    def realpath(self, path):
+        with self._lock:
+            try:
+                return self._walk(path)[3]
+            except OSError:
+                return self.abspath(path)
+
+    def stat(self, path, follow_links=True):
+        with self._lock:
+            node = self._get(path, follow_links)
+            if node.kind == 'd':
+                mode, size = stat.S_IFDIR, 0
+            elif node.kind == 'f':
+                mode, size = stat.S_IFREG, len(node.data)
+            else:
+                mode, size = stat.S_IFLNK, len(node.target)
+            times = node.atime_ns, node.mtime_ns, node.ctime_ns
+        uid = os.getuid() if hasattr(os, 'getuid') else 0
+        gid = os.getgid() if hasattr(os, 'getgid') else 0
+        return os.stat_result(
+            (mode | node.mode, node.ino, self.device,
+             2 if node.kind == 'd' else 1, uid, gid, size) +
+            tuple(t // 1000000000 for t in times),
+            {'st_atime': times[0] / 1e9, 'st_mtime': times[1] / 1e9,
+             'st_ctime': times[2] / 1e9, 'st_atime_ns': times[0],
+             'st_mtime_ns': times[1], 'st_ctime_ns': times[2]})
+
+    def lstat(self, path):
+        return self.stat(path, False)
+
+    def listdir(self, path):
+        with self._lock:
+            node = self._get(path)
+            if node.kind != 'd':
+                raise self._error(errno.ENOTDIR, path)
+            names = list(node.entries)
+        if self.listing_order == 'sorted':
+            names.sort()
+        elif self.listing_order == 'reversed':
+            names.reverse()
+        return names
+
+    def mkdir(self, path, mode=0o777):
+        with self._lock:
+            self._create(path, 'd', mode)
+
+    def rmdir(self, path):
+        with self._lock:
+            parent, name, node, full = self._walk(path, False)
+            if node is None:
+                raise self._error(errno.ENOENT, path)
+            elif node.kind != 'd':
+                raise self._error(errno.ENOTDIR, path)
+            elif parent is None:
+                raise self._error(errno.EBUSY, path)
+            elif node.entries:
+                raise self._error(errno.ENOTEMPTY, path)
+            del parent.entries[name]
+            parent.mtime_ns = parent.ctime_ns = _now_ns()
+
+    def unlink(self, path):
+        with self._lock:
+            parent, name, node, full = self._walk(path, False)
+            if node is None:
+                raise self._error(errno.ENOENT, path)
+            elif node.kind == 'd':
+                raise self._error(errno.EISDIR, path)
+            del parent.entries[name]
+            parent.mtime_ns = parent.ctime_ns = _now_ns()
+
+    def rename(self, src, dst):
+        with self._lock:
+            sparent, sname, snode, sfull = self._walk(src, False)
+            if snode is None:
+                raise self._error(errno.ENOENT, src)
+            dparent, dname, dnode, dfull = self._walk(dst, False)
+            if sparent is None or dparent is None:
+                raise self._error(errno.EBUSY, src)
+            if snode is dnode:
+                return
+            if snode.kind == 'd':
+                if (dfull == sfull or
+                        dfull.startswith(self._lib.join(sfull, sfull[:0]))):
+                    raise self._error(errno.EINVAL, src)
+                if dnode is not None:
+                    if dnode.kind != 'd':
+                        raise self._error(errno.ENOTDIR, dst)
+                    elif dnode.entries:
+                        raise self._error(errno.ENOTEMPTY, dst)
+            elif dnode is not None and dnode.kind == 'd':
+                raise self._error(errno.EISDIR, dst)
+            del sparent.entries[sname]
+            dparent.entries.pop(dname, None)
+            dparent.entries[dname] = snode
+            now = _now_ns()
+            snode.ctime_ns = now
+            for parent in (sparent, dparent):
+                parent.mtime_ns = parent.ctime_ns = now
+
+    def symlink(self, target, path):
+        with self._lock:
+            node = self._create(path, 'l', 0o777)
+            node.mode = 0o777
+            node.target = target
+
+    def readlink(self, path):
+        with self._lock:
+            node = self._get(path, False)
+            if node.kind != 'l':
+                raise self._error(errno.EINVAL, path)
+            return node.target
+
+    def chmod(self, path, mode):
+        with self._lock:
+            node = self._get(path)
+            node.mode = mode & 0o7777
+            node.ctime_ns = _now_ns()
+
+    def utime(self, path, ns):
+        with self._lock:
+            node = self._get(path)
+            node.atime_ns, node.mtime_ns = ns
+            node.ctime_ns = _now_ns()
+
+    def open(self, path, mode='r', buffering=-1, encoding=None, errors=None,
+             newline=None):
+        kind = mode.replace('b', '').replace('t', '').replace('+', '')
+        if kind not in ('r', 'w', 'a', 'x'):
+            raise ValueError("invalid mode: %r" % mode)
+        with self._lock:
+            parent, name, node, full = self._walk(path)
+            if node is None:
+                if kind == 'r':
+                    raise self._error(errno.ENOENT, path)
+                node = self._create(full, 'f', 0o666)
+            elif kind == 'x':
+                raise self._error(errno.EEXIST, path)
+            elif node.kind == 'd':
+                raise self._error(errno.EISDIR, path)
+            if kind == 'w':
+                node.data = b''
+                node.mtime_ns = node.ctime_ns = _now_ns()
+            fp = _MemoryFile(self, node, path,
+                             readable=kind == 'r' or '+' in mode,
+                             writable=kind != 'r' or '+' in mode,
+                             append=kind == 'a')
+        if 'b' in mode:
+            return fp
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        return io.TextIOWrapper(fp, encoding, errors, newline)
+
+    def mkdtemp(self, suffix='', prefix=None, dir=None):
+        if prefix is None:
+            prefix = tempfile.template
+        if dir is None:
+            dir = self._tmp
+            if not self.isdir(dir):
+                self.makedirs(dir)
+        while True:
+            token = codecs.encode(os.urandom(6), 'hex').decode('ascii')
+            path = (self.Path(dir) / (prefix + token + suffix)).path
+            try:
+                self.mkdir(path, 0o700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            else:
+                return path
+
+    def mkstemp(self, suffix='', prefix=None, dir=None, text=False):
+        """Creates a temporary file.
+
+        Memory files don't have descriptors, so this returns an open binary
+        file object (with a :meth:`~io.IOBase.fileno` that raises) instead.
+        """
+        if prefix is None:
+            prefix = tempfile.template
+        if dir is None:
+            dir = self._tmp
+            if not self.isdir(dir):
+                self.makedirs(dir)
+        while True:
+            token = codecs.encode(os.urandom(6), 'hex').decode('ascii')
+            path = (self.Path(dir) / (prefix + token + suffix)).path
+            try:
+                with self._lock:
+                    fp = self.open(path, 'x+b')
+                    self.chmod(path, 0o600)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            else:
+                return fp, path
+
+
 class Path(DefaultAbstractPath):
     """A concrete representation of an actual path on this system.
 
@@ -468,6 +3307,8 @@ class Path(DefaultAbstractPath):
     :class:`~rpaths.PosixPath` depending on the current system. It adds
     concrete filesystem operations.
     """
+    _fs = OSFileSystem()
+
     @property
     def _encoding(self):
         return sys.getfilesystemencoding()
@@ -476,12 +3317,22 @@ class Path(DefaultAbstractPath):
     def cwd(cls):
         """Returns the current directory.
         """
-        return cls(os.getcwd())
+        return cls(cls._fs.getcwd())
 
     def chdir(self):
         """Changes the current directory to this path.
         """
-        os.chdir(self.path)
+        self._fs.chdir(self.path)
+
+    if DIR_FD_SUPPORTED:
+        def open_dir(self):
+            """Opens this directory, returning a :class:`~rpaths.DirHandle`.
+
+            This can be used as a context manager that closes it.
+            """
+            # Descriptors are not inherited by child processes (PEP 446)
+            return DirHandle(self, os.open(
+                self.path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)))
 
     @contextlib.contextmanager
     def in_dir(self):
@@ -500,6 +3351,7 @@ class Path(DefaultAbstractPath):
 
         The return value is a pair (fd, path) where fd is the file descriptor
         returned by :func:`os.open`, and path is a :class:`~rpaths.Path` to it.
+        On a :class:`MemoryFS`, fd is an open binary file object instead.
 
         :param suffix: If specified, the file name will end with that suffix,
             otherwise there will be no suffix.
@@ -521,15 +3373,51 @@ class Path(DefaultAbstractPath):
 
         The caller is responsible for deleting the file when done with it.
         """
-        if prefix is None:
-            prefix = tempfile.template
         if dir is not None:
             # Note that this is not safe on Python 2
             # There is no work around, apart from not using the tempfile module
-            dir = str(Path(dir))
-        fd, filename = tempfile.mkstemp(suffix, prefix, dir, text)
+            dir = str(cls(dir))
+        fd, filename = cls._fs.mkstemp(suffix, prefix, dir, text)
         return fd, cls(filename).absolute()
 
+    @classmethod
+    @contextlib.contextmanager
+    def memfile(cls, suffix='', prefix=None, dir=None, fallback=True):
+        """Context manager giving a temporary file that lives in memory.
+
+        This gives a pair (fd, path) like :meth:`~rpaths.Path.tempfile`. On
+        Linux, the file is created with :func:`os.memfd_create`, and never
+        touches the disk; `path` is then under ``/proc/<pid>/fd``, and can be
+        opened by this process and others (as long as this one keeps the file
+        open). Note that this path has no suffix.
+
+        If memory files are not supported, a file is created on disk with
+        :meth:`~rpaths.Path.tempfile` (passing `suffix`, `prefix` and `dir`),
+        unless `fallback` is False, in which case :exc:`RuntimeError` is
+        raised.
+
+        The descriptor belongs to the context manager: it is closed, and the
+        file deleted, at the end of the context. The caller must not close it
+        (the number could be reused by another file in the meantime); use
+        :func:`os.dup` to get a descriptor that can be closed or passed to
+        :func:`os.fdopen`.
+        """
+        memfd = (hasattr(os, 'memfd_create') and
+                 os.path.isdir('/proc/%d/fd' % os.getpid()))
+        if memfd:
+            fd = os.memfd_create(prefix or 'rpaths')
+            path = cls('/proc/%d/fd/%d' % (os.getpid(), fd))
+        elif fallback:
+            fd, path = cls.tempfile(suffix, prefix, dir)
+        else:
+            raise RuntimeError("Memory files are not supported")
+        try:
+            yield fd, path
+        finally:
+            os.close(fd)
+            if not memfd:
+                path.remove()
+
     @classmethod
     def tempdir(cls, suffix='', prefix=None, dir=None):
         """Returns a new temporary directory.
@@ -547,14 +3435,14 @@ class Path(DefaultAbstractPath):
         if dir is not None:
             # Note that this is not safe on Python 2
             # There is no work around, apart from not using the tempfile module
-            dir = str(Path(dir))
-        dirname = tempfile.mkdtemp(suffix, prefix, dir)
+            dir = str(cls(dir))
+        dirname = cls._fs.mkdtemp(suffix, prefix, dir)
         return cls(dirname).absolute()
 
     def absolute(self):
         """Returns a normalized absolutized version of the path.
         """
-        return self.__class__(self._lib.abspath(self.path))
+        return self.__class__(self._fs.abspath(self.path))
 
     def rel_path_to(self, dest):
         """Builds a relative path leading from this one to another.
@@ -565,7 +3453,8 @@ class Path(DefaultAbstractPath):
         Contrary to :class:`~rpaths.AbstractPath`'s version, this will also
         work if one path is relative and the other absolute.
         """
-        return super(Path, self.absolute()).rel_path_to(Path(dest).absolute())
+        return super(Path, self.absolute()).rel_path_to(
+            self.__class__(dest).absolute())
 
     def relative(self):
         """Builds a relative version of this path from the current directory.
@@ -577,7 +3466,7 @@ class Path(DefaultAbstractPath):
     def resolve(self):
         """Expands the symbolic links in the path.
         """
-        return self.__class__(self._lib.realpath(self.path))
+        return self.__class__(self._fs.realpath(self.path))
 
     def listdir(self, pattern=None):
         """Returns a list of all the files in this directory.
@@ -587,7 +3476,8 @@ class Path(DefaultAbstractPath):
         :param pattern: A pattern to match directory entries against.
         :type pattern: NoneType | Callable | Pattern | unicode | bytes
         """
-        files = [self / self.__class__(p) for p in os.listdir(self.path)]
+        files = [self / self.__class__(p)
+                 for p in self._fs.listdir(self.path)]
         if pattern is None:
             pass
         elif callable(pattern):
@@ -611,7 +3501,9 @@ class Path(DefaultAbstractPath):
         return files
 
     def recursedir(self, pattern=None, top_down=True, follow_links=False,
-                   handle_errors=None):
+                   handle_errors=None, type=None, min_size=None,
+                   max_size=None, newer_than=None, older_than=None,
+                   max_depth=None, with_info=False):
         """Recursively lists all files under this directory.
 
         :param pattern: An extended patterns, where:
@@ -637,6 +3529,33 @@ class Path(DefaultAbstractPath):
             an error is encountered while accessing the filesystem (such as a
             permission issue). If set to None (the default), exceptions will be
             propagated.
+
+        :param type: Only list files of that type: ``'f'`` for regular files,
+            ``'d'`` for directories, ``'l'`` for symbolic links. If
+            `follow_links` is set, links are also listed as the type of their
+            target.
+
+        :param min_size: Only list files of at least that size, in bytes.
+
+        :param max_size: Only list files of at most that size, in bytes.
+
+        :param newer_than: Only list files modified after that time, given as
+            a number of seconds since the epoch or as a
+            :class:`~datetime.timedelta` (relative to now).
+
+        :param older_than: Only list files modified before that time, given as
+            a number of seconds since the epoch or as a
+            :class:`~datetime.timedelta` (relative to now).
+
+        :param max_depth: Don't list files more than that many levels under
+            this directory (1 means only list this directory's entries).
+
+        :param with_info: If True, pairs ``(path, info)`` are returned, where
+            `info` is a :class:`~rpaths.FileInfo` object (or None if the file
+            couldn't be accessed).
+
+        The filters above are evaluated using the metadata that the traversal
+        already needs, so they don't cause additional system calls.
         """
         if not self.is_dir():
             raise ValueError("recursedir() called on non-directory %s" % self)
@@ -658,7 +3577,7 @@ class Path(DefaultAbstractPath):
             else:
                 raise TypeError("recursedir() expects pattern to be a "
                                 "callable, a regular expression or a string "
-                                "pattern, got %r" % type(pattern))
+                                "pattern, got %r" % pattern.__class__)
             if self._lib.sep != '/':
                 pattern = lambda p: full_re.search(
                     unicode(p).replace(self._lib.sep, '/'))
@@ -669,93 +3588,370 @@ class Path(DefaultAbstractPath):
                 pattern = lambda p: full_re.search(unicode(p))
                 if int_re is not None:
                     int_pattern = lambda p: int_re.search(unicode(p))
+        entry_filter = self._info_filter(type, min_size, max_size,
+                                         newer_than, older_than)
         if not start:
             path = self
+            depth = 1
         else:
             path = self / start
+            depth = len(start.split('/')) + 1
             if not path.exists():
                 return []
+            elif max_depth is not None and depth - 1 > max_depth:
+                return []
             elif not path.is_dir():
-                return [path]
-        return path._recursedir(pattern=pattern, int_pattern=int_pattern,
-                                top_down=top_down, seen=set(),
-                                path=self.__class__(start),
-                                follow_links=follow_links,
-                                handle_errors=handle_errors)
+                try:
+                    info = path.info(follow_links=follow_links)
+                except OSError:
+                    info = None
+                if entry_filter is not None and (info is None or
+                                                 not entry_filter(info)):
+                    return []
+                elif with_info:
+                    return [(path, info)]
+                else:
+                    return [path]
+            elif max_depth is not None and depth > max_depth:
+                return []
+        results = path._recursedir(pattern=pattern, int_pattern=int_pattern,
+                                   top_down=top_down, seen=set(),
+                                   path=self.__class__(start),
+                                   follow_links=follow_links,
+                                   handle_errors=handle_errors,
+                                   entry_filter=entry_filter,
+                                   depth=depth, max_depth=max_depth)
+        if with_info:
+            return results
+        else:
+            return (p for p, info in results)
+
+    @staticmethod
+    def _info_filter(type=None, min_size=None, max_size=None,
+                     newer_than=None, older_than=None):
+        """Builds a function filtering :class:`~rpaths.FileInfo` objects.
+
+        Returns None if no filtering is requested.
+        """
+        conditions = []
+        if type is not None:
+            try:
+                attr = {'f': 'is_file', 'd': 'is_dir', 'l': 'is_link'}[type]
+            except KeyError:
+                raise ValueError("type should be one of 'f', 'd', 'l', got "
+                                 "%r" % type)
+            conditions.append(lambda i: getattr(i, attr))
+        if min_size is not None:
+            conditions.append(lambda i: i.size >= min_size)
+        if max_size is not None:
+            conditions.append(lambda i: i.size <= max_size)
+        if newer_than is not None or older_than is not None:
+            now = time.time()
+
+            def to_ns(t):
+                if isinstance(t, datetime.timedelta):
+                    t = now - t.total_seconds()
+                return int(t * 1000000000)
+            if newer_than is not None:
+                newer_than = to_ns(newer_than)
+                conditions.append(lambda i: i.mtime_ns > newer_than)
+            if older_than is not None:
+                older_than = to_ns(older_than)
+                conditions.append(lambda i: i.mtime_ns < older_than)
+        if not conditions:
+            return None
+        return lambda i: all(cond(i) for cond in conditions)
 
     def _recursedir(self, pattern, int_pattern, top_down, seen, path,
-                    follow_links=False, handle_errors=None):
+                    follow_links=False, handle_errors=None,
+                    entry_filter=None, depth=1, max_depth=None):
         real_dir = self.resolve()
         if real_dir in seen:
             return
         seen.add(real_dir)
         try:
-            dir_list = os.listdir(self.path)
+            dir_list = self._fs.listdir(self.path)
         except OSError:
             if handle_errors is not None:
                 handle_errors(self.path)
                 return
             raise
+        recurse = max_depth is None or depth < max_depth
         for child in dir_list:
             newpath = path / child
             child = self / child
-            is_dir = child.is_dir() and (not child.is_link() or follow_links)
+            # A single lstat() gives us everything, unless we have to follow
+            # a link
+            try:
+                st = self._fs.lstat(child.path)
+            except OSError:
+                info = None
+            else:
+                info = None
+                if follow_links and stat.S_ISLNK(st.st_mode):
+                    try:
+                        info = FileInfo(self._fs.stat(child.path),
+                                        is_link=True)
+                    except OSError:  # Broken link
+                        pass
+                if info is None:
+                    info = FileInfo(st)
+            is_dir = recurse and info is not None and info.is_dir
             # Fast failing thanks to int_pattern here: if we don't match
             # int_pattern, don't try inner files either
             matches_pattern = pattern(newpath)
             if (not matches_pattern and
                     int_pattern is not None and not int_pattern(newpath)):
                 continue
+            if matches_pattern and entry_filter is not None:
+                matches_pattern = info is not None and entry_filter(info)
             if is_dir and not top_down:
                 for grandkid in child._recursedir(pattern, int_pattern,
                                                   top_down, seen, newpath,
-                                                  follow_links, handle_errors):
+                                                  follow_links, handle_errors,
+                                                  entry_filter, depth + 1,
+                                                  max_depth):
                     yield grandkid
             if matches_pattern:
-                yield child
+                yield child, info
             if is_dir and top_down:
                 for grandkid in child._recursedir(pattern, int_pattern,
                                                   top_down, seen, newpath,
-                                                  follow_links, handle_errors):
+                                                  follow_links, handle_errors,
+                                                  entry_filter, depth + 1,
+                                                  max_depth):
                     yield grandkid
 
+    def index(self, db_path, refresh=True, handle_errors=None):
+        """Builds or opens a persistent index of the tree under this directory.
+
+        Returns a :class:`~rpaths.TreeIndex` backed by the SQLite database at
+        `db_path`, which can be queried much faster than walking the tree.
+
+        :param refresh: If True (the default), the index is brought up to date
+            first (see :meth:`~rpaths.TreeIndex.refresh`).
+
+        :param handle_errors: Passed to :meth:`~rpaths.TreeIndex.refresh`.
+        """
+        index = TreeIndex(self, db_path)
+        if refresh:
+            index.refresh(handle_errors=handle_errors)
+        return index
+
+    if sys.platform.startswith('linux'):
+        def watch(self, recursive=True, pattern=None, latency=0.05):
+            """Watches this directory for changes.
+
+            Returns a :class:`~rpaths.Watcher`, which can be iterated on
+            (synchronously or asynchronously) to get the changes as they
+            happen. This uses inotify and is only available on Linux.
+
+            :param recursive: If True (the default), subdirectories are
+                watched too, including the ones created later.
+
+            :param pattern: Only report changes to files matching this extended
+                pattern (see :meth:`~rpaths.Path.recursedir`). Directories that
+                can't contain matching files are not watched at all.
+            :type pattern: NoneType | Pattern | unicode | bytes
+
+            :param latency: Events happening within that many seconds of the
+                first one are batched and coalesced.
+            """
+            return Watcher(self, recursive=recursive, pattern=pattern,
+                           latency=latency)
+
+    def snapshot(self, previous=None, handle_errors=None):
+        """Records the state of the directory tree under this path.
+
+        Returns a :class:`~rpaths.Snapshot`, which can be compared with a later
+        one using :meth:`~rpaths.Snapshot.diff`. Symbolic links are not
+        followed.
+
+        :param previous: An older snapshot of the same tree. Directories whose
+            modification time didn't change since then are not listed again;
+            the files they contained are only stat'ed.
+
+        :param handle_errors: Can be set to a callback that will be called when
+            a directory can't be listed. If set to None (the default),
+            exceptions will be propagated.
+        """
+        st = os.lstat(self.path)
+        if not stat.S_ISDIR(st.st_mode):
+            raise ValueError("snapshot() called on non-directory %s" % self)
+        root_entry = SnapshotEntry('d', st.st_size, stat_time_ns(st, 'mtime'),
+                                   st.st_ino)
+        entries = {}
+        children = {}
+
+        to_list = [(self, self.__class__(''), root_entry)]
+        while to_list:
+            directory, rel, entry = to_list.pop()
+            if previous is None:
+                old = None
+            elif directory is self:
+                old = previous._root_entry
+            else:
+                old = previous.entries.get(rel)
+            if (old is not None and old.type == 'd' and
+                    old.mtime_ns == entry.mtime_ns and
+                    old.inode == entry.inode and rel in previous._children):
+                names = previous._children[rel]
+            else:
+                try:
+                    names = os.listdir(directory.path)
+                except OSError:
+                    if handle_errors is not None:
+                        handle_errors(directory.path)
+                        continue
+                    raise
+            children[rel] = names
+            for name in names:
+                child_rel = rel / name
+                child = directory / name
+                try:
+                    st = os.lstat(child.path)
+                except OSError:
+                    # Removed since listing
+                    continue
+                child_entry = SnapshotEntry(_snapshot_type(st.st_mode),
+                                            st.st_size,
+                                            stat_time_ns(st, 'mtime'),
+                                            st.st_ino)
+                entries[child_rel] = child_entry
+                if child_entry.type == 'd':
+                    to_list.append((child, child_rel, child_entry))
+        return Snapshot(self, entries, children, root_entry)
+
+    def disk_usage(self, by_depth=None, apparent=False, workers=None,
+                   handle_errors=None):
+        """Computes the disk space used by this directory and those under it.
+
+        Returns a dictionary mapping relative paths of directories to the
+        total size of the files under them, in bytes; this directory itself
+        is under ``Path('.')``. Files with multiple hard links are only
+        counted once. Symbolic links are not followed.
+
+        :param by_depth: Only report directories up to that many levels under
+            this one (0 only reports the total).
+
+        :param apparent: If True, the sizes of the files are used. By default,
+            the space allocated on disk is used.
+
+        :param workers: Number of threads walking the subdirectories of this
+            one concurrently.
+
+        :param handle_errors: Can be set to a callback that will be called when
+            a directory can't be listed. If set to None (the default),
+            exceptions will be propagated.
+        """
+        seen = set()
+        seen_lock = threading.Lock()
+
+        def scan(top, top_rel, recurse=True):
+            """Lists a tree, returning the directories in pre-order.
+
+            The directories are tuples ``(rel, size, subdirs)`` where `size`
+            only counts the directory's entries, not its subdirectories.
+            """
+            directories = []
+            to_scan = [(top, top_rel, os.lstat(top.path))]
+            while to_scan:
+                directory, rel, st = to_scan.pop()
+                info = FileInfo(st)
+                size = info.size if apparent else info.allocated
+                subdirs = []
+                try:
+                    names = os.listdir(directory.path)
+                except OSError:
+                    if handle_errors is None:
+                        raise
+                    handle_errors(directory.path)
+                    names = []
+                for name in names:
+                    child = directory / name
+                    try:
+                        st = os.lstat(child.path)
+                    except OSError:
+                        # Removed since listing
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        subdirs.append(rel / name)
+                        if recurse:
+                            to_scan.append((child, rel / name, st))
+                        continue
+                    info = FileInfo(st)
+                    if info.nlink > 1:
+                        key = info.device, info.inode
+                        with seen_lock:
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                    size += info.size if apparent else info.allocated
+                directories.append((rel, size, subdirs))
+            return directories
+
+        # Scan this directory, then its subdirectories concurrently
+        root = self.__class__('')
+        directories = scan(self, root, recurse=False)
+        for item, error, result in threaded_map(
+                lambda rel: scan(self / rel, rel),
+                directories[0][2], workers, ordered=False):
+            if error is not None:
+                if handle_errors is None or not isinstance(error, OSError):
+                    raise error
+                handle_errors((self / item).path)
+                continue
+            directories.extend(result)
+
+        totals = {}
+        depths = {root: 0}
+        for rel, size, subdirs in directories:
+            for subdir in subdirs:
+                depths[subdir] = depths[rel] + 1
+        for rel, size, subdirs in reversed(directories):
+            totals[rel] = size + sum(totals.get(d, 0) for d in subdirs)
+        if by_depth is not None:
+            totals = dict((rel, total) for rel, total in totals.items()
+                          if depths[rel] <= by_depth)
+        return totals
+
     def exists(self):
         """True if the file exists, except for broken symlinks where it's
         False.
         """
-        return self._lib.exists(self.path)
+        return self._fs.exists(self.path)
 
     def lexists(self):
         """True if the file exists, even if it's a broken symbolic link.
         """
-        return self._lib.lexists(self.path)
+        return self._fs.lexists(self.path)
 
     def is_file(self):
         """True if this file exists and is a regular file.
         """
-        return self._lib.isfile(self.path)
+        return self._fs.isfile(self.path)
 
     def is_dir(self):
         """True if this file exists and is a directory.
         """
-        return self._lib.isdir(self.path)
+        return self._fs.isdir(self.path)
 
     def is_link(self):
         """True if this file exists and is a symbolic link.
         """
-        return self._lib.islink(self.path)
+        return self._fs.islink(self.path)
 
     def is_mount(self):
         """True if this file is a mount point.
         """
-        return self._lib.ismount(self.path)
+        return self._fs.ismount(self.path)
 
     def atime(self):
         """Returns the time of last access to this path.
 
         This returns a number of seconds since the epoch.
         """
-        return self._lib.getatime(self.path)
+        return self._fs.stat(self.path).st_atime
 
     def ctime(self):
         """Returns the ctime of this path.
@@ -764,19 +3960,19 @@ class Path(DefaultAbstractPath):
         others (like Windows), it is the creation time for path. In any case,
         it is a number of seconds since the epoch.
         """
-        return self._lib.getctime(self.path)
+        return self._fs.stat(self.path).st_ctime
 
     def mtime(self):
         """Returns the time of last modification of this path.
 
         This returns a number of seconds since the epoch.
         """
-        return self._lib.getmtime(self.path)
+        return self._fs.stat(self.path).st_mtime
 
     def size(self):
         """Returns the size, in bytes, of the file.
         """
-        return self._lib.getsize(self.path)
+        return self._fs.stat(self.path).st_size
 
     if hasattr(os.path, 'samefile'):
         def same_file(self, other):
@@ -784,13 +3980,70 @@ class Path(DefaultAbstractPath):
 
             In particular, this identifies hard links.
             """
-            return self._lib.samefile(self.path, self._to_backend(other))
+            return self._fs.samefile(self.path, self._to_backend(other))
 
     def stat(self):
-        return os.stat(self.path)
+        return self._fs.stat(self.path)
 
     def lstat(self):
-        return os.lstat(self.path)
+        return self._fs.lstat(self.path)
+
+    @classmethod
+    def stat_many(cls, paths, workers=8, follow_links=True, ordered=True,
+                  handle_errors=None):
+        """Gets the stat results for many paths, issuing the calls in parallel.
+
+        This yields pairs ``(path, stat_result)``. It is much faster than
+        calling :meth:`~rpaths.Path.stat` in a loop when the latency of each
+        call is high, for instance on network filesystems.
+
+        :param paths: The paths to query. This can be any iterable, and is
+            consumed lazily; only a few calls per worker are in flight at any
+            given time.
+
+        :param workers: The number of threads issuing the calls.
+
+        :param follow_links: If True (the default), :func:`os.stat` is used,
+            else :func:`os.lstat`.
+
+        :param ordered: If True (the default), results are yielded in the same
+            order as `paths`. Else they are yielded as they complete.
+
+        :param handle_errors: Can be set to a callback that will be called when
+            an error is encountered while accessing the filesystem (such as a
+            missing file), in which case the path will not be yielded. If set
+            to None (the default), the exception is yielded in place of the
+            stat result.
+        """
+        statfunc = cls._fs.stat if follow_links else cls._fs.lstat
+        results = threaded_map(lambda p: statfunc(p.path),
+                               (cls(p) for p in paths),
+                               workers=workers, ordered=ordered)
+        for path, error, result in results:
+            if error is not None:
+                if not isinstance(error, OSError):
+                    raise error
+                if handle_errors is not None:
+                    handle_errors(path.path)
+                    continue
+                result = error
+            yield path, result
+
+    def info(self, follow_links=True):
+        """Returns a :class:`~rpaths.FileInfo` object describing this path.
+
+        This only does a single system call (two if this is a symbolic link
+        that needs to be followed), instead of one per query like
+        :meth:`~rpaths.Path.is_dir`, :meth:`~rpaths.Path.size`, ...
+
+        :param follow_links: If True (the default), the information is about
+            the file a symbolic link points to. The `is_link` attribute still
+            indicates whether this path is a link.
+        """
+        st = self._fs.lstat(self.path)
+        if follow_links and stat.S_ISLNK(st.st_mode):
+            return FileInfo(self._fs.stat(self.path), is_link=True)
+        return FileInfo(st)
 
     if hasattr(os, 'statvfs'):
         def statvfs(self):
@@ -800,7 +4053,7 @@ class Path(DefaultAbstractPath):
         def chmod(self, mode):
             """Changes the mode of the path to the given numeric `mode`.
             """
-            return os.chmod(self.path, mode)
+            return self._fs.chmod(self.path, mode)
 
     if hasattr(os, 'chown'):
         def chown(self, uid=-1, gid=-1):
@@ -828,11 +4081,122 @@ class Path(DefaultAbstractPath):
         if self.exists():
             return
         if parents:
-            os.makedirs(self.path, mode)
+            self._fs.makedirs(self.path, mode)
         else:
-            os.mkdir(self.path, mode)
+            self._fs.mkdir(self.path, mode)
         return self
 
+    @classmethod
+    def mkdirs(cls, paths, mode=0o777, workers=None, dir_fds=False):
+        """Creates many directories, and the missing directories leading to
+        them.
+
+        The paths are sorted and merged into a tree, so that each distinct
+        directory is created exactly once, parents before children, with a
+        single system call. The deepest existing directory above each path is
+        found first, walking up from it and remembering what was seen, so only
+        the missing directories are touched. This is much faster than calling
+        :meth:`~rpaths.Path.mkdir` with ``parents=True`` on each path.
+
+        Returns the number of directories that were created.
+
+        :param mode: Permissions associated with the new directories.
+
+        :param workers: If set, the first levels of the tree are created, then
+            the independent subtrees below them are created in parallel by
+            that many threads.
+
+        :param dir_fds: If True, and the system supports it, directories are
+            created relative to a descriptor for their parent, so the full path
+            doesn't have to be resolved each time.
+        """
+        tree = {}
+        paths = sorted(set(cls(p).absolute() for p in paths))
+        for path in paths:
+            node = tree
+            for component in path.components:
+                node = node.setdefault(component.path, {})
+        fs = cls._fs
+        use_fds = dir_fds and DIR_FD_SUPPORTED and fs.native
+        join = cls._lib.join
+
+        # Walk up from each path to the first directory known or found to
+        # exist; everything below it is missing
+        existing = set()
+        missing = set()
+        for path in paths:
+            while (path not in existing and path not in missing and
+                   not fs.exists(path.path)):
+                missing.add(path)
+                path = path.parent
+            existing.add(path)
+        missing = set(path.path for path in missing)
+
+        # Only keep the subtrees to create, under the directories that exist
+        roots = {}
+        to_visit = list(tree.items())
+        while to_visit:
+            path, children = to_visit.pop()
+            for name, grandchildren in children.items():
+                child = join(path, name)
+                if child in missing:
+                    roots.setdefault(path, {})[name] = grandchildren
+                else:
+                    to_visit.append((child, grandchildren))
+
+        def make(path, name, dir_fd):
+            try:
+                if dir_fd is None:
+                    fs.mkdir(path, mode)
+                else:
+                    os.mkdir(name, mode, dir_fd=dir_fd)
+            except OSError as e:
+                # Existing parents might not be writable, or be on a
+                # read-only filesystem; some systems report that first
+                if e.errno in (errno.EEXIST, errno.EACCES, errno.EPERM,
+                               errno.EROFS) and fs.isdir(path):
+                    return 0
+                raise
+            return 1
+
+        def build(item):
+            path, children = item
+            created = 0
+            dir_fd = None
+            if use_fds:
+                dir_fd = os.open(path, os.O_RDONLY |
+                                 getattr(os, 'O_DIRECTORY', 0) |
+                                 getattr(os, 'O_CLOEXEC', 0))
+            try:
+                for name in sorted(children):
+                    child = join(path, name)
+                    created += make(child, name, dir_fd)
+                    if children[name]:
+                        created += build((child, children[name]))
+            finally:
+                if dir_fd is not None:
+                    os.close(dir_fd)
+            return created
+
+        # Roots exist; create levels breadth-first until there are enough
+        # independent subtrees to keep the workers busy
+        created = 0
+        queue = collections.deque(roots.items())
+        if workers is not None and workers > 1:
+            while queue and len(queue) < workers * 4:
+                path, children = queue.popleft()
+                for name in sorted(children):
+                    child = join(path, name)
+                    created += make(child, name, None)
+                    if children[name]:
+                        queue.append((child, children[name]))
+        for item, error, result in threaded_map(build, queue, workers,
+                                                ordered=False):
+            if error is not None:
+                raise error
+            created += result
+        return created
+
     def rmdir(self, parents=False):
         """Removes this directory, provided it is empty.
 
@@ -842,14 +4206,14 @@ class Path(DefaultAbstractPath):
             directory above it until an error is encountered.
         """
         if parents:
-            os.removedirs(self.path)
+            self._fs.removedirs(self.path)
         else:
-            os.rmdir(self.path)
+            self._fs.rmdir(self.path)
 
     def remove(self):
         """Removes this file.
         """
-        os.remove(self.path)
+        self._fs.unlink(self.path)
 
     def rename(self, new, parents=False):
         """Renames this path to the given new location.
@@ -860,9 +4224,9 @@ class Path(DefaultAbstractPath):
             of the target if they don't exist.
         """
         if parents:
-            os.renames(self.path, self._to_backend(new))
+            self._fs.renames(self.path, self._to_backend(new))
         else:
-            os.rename(self.path, self._to_backend(new))
+            self._fs.rename(self.path, self._to_backend(new))
 
     if hasattr(os, 'link'):
         def hardlink(self, newpath):
@@ -874,7 +4238,7 @@ class Path(DefaultAbstractPath):
         def symlink(self, target):
             """Create a symbolic link here, pointing to the given `target`.
             """
-            os.symlink(self._to_backend(target), self.path)
+            self._fs.symlink(self._to_backend(target), self.path)
 
     if hasattr(os, 'readlink'):
         def read_link(self, absolute=False):
@@ -882,39 +4246,57 @@ class Path(DefaultAbstractPath):
 
             If `absolute` is True, the target is made absolute.
             """
-            p = self.__class__(os.readlink(self.path))
+            p = self.__class__(self._fs.readlink(self.path))
             if absolute:
                 return (self.parent / p).absolute()
             else:
                 return p
 
-    def copyfile(self, target):
+    def copyfile(self, target, strategy=None, sparse=False):
         """Copies this file to the given `target` location.
+
+        The copy happens in the kernel when possible; see
+        :func:`~rpaths.copy_file_contents` for the strategies that are tried.
+        Returns the name of the strategy that was used.
+
+        :param strategy: The name of a strategy to use, or a list of strategies
+            to try in order.
+
+        :param sparse: If True, holes in this file are recreated in the target
+            instead of being filled with zeros.
         """
-        shutil.copyfile(self.path, self._to_backend(target))
+        return self._fs.copyfile(self.path, self._to_backend(target),
+                                 strategy, sparse)
 
     def copymode(self, target):
         """Copies the mode of this file on the `target` file.
 
         The owner is not copied.
         """
-        shutil.copymode(self.path, self._to_backend(target))
+        self._fs.copymode(self.path, self._to_backend(target))
 
     def copystat(self, target):
         """Copies the permissions, times and flags from this to the `target`.
 
         The owner is not copied.
         """
-        shutil.copystat(self.path, self._to_backend(target))
+        self._fs.copystat(self.path, self._to_backend(target))
 
-    def copy(self, target):
+    def copy(self, target, strategy=None, sparse=False):
         """Copies this file the `target`, which might be a directory.
 
-        The permissions are copied.
+        The permissions are copied. Returns the name of the strategy that was
+        used, like :meth:`~rpaths.Path.copyfile`.
         """
-        shutil.copy(self.path, self._to_backend(target))
-
-    def copytree(self, target, symlinks=False):
+        target = self.__class__(target)
+        if target.is_dir():
+            target = target / self.name
+        used = self.copyfile(target, strategy, sparse)
+        self.copymode(target)
+        return used
+
+    def copytree(self, target, symlinks=False, strategy=None, sparse=False,
+                 workers=None, progress=None):
         """Recursively copies this directory to the `target` location.
 
         The permissions and times are copied (like
@@ -923,21 +4305,616 @@ class Path(DefaultAbstractPath):
         If the optional `symlinks` flag is true, symbolic links in the source
         tree result in symbolic links in the destination tree; if it is false,
         the contents of the files pointed to by symbolic links are copied.
+
+        The directory structure is created first, then the files are copied,
+        using `workers` threads if specified. `strategy` and `sparse` are used
+        for each file (see :meth:`~rpaths.Path.copyfile`).
+
+        :param progress: A callback that will be called with a
+            :class:`~rpaths.CopyProgress` tuple after each file is copied.
+
+        Returns a :class:`~collections.Counter` of the copy strategies used. If
+        some files can't be copied, the others are still copied, then
+        :class:`shutil.Error` is raised with the list of errors.
+        """
+        target = self.__class__(target)
+        fs = self._fs
+        fs.makedirs(target.path)
+        errors = []
+        directories = []
+        files = []
+        total_bytes = 0
+
+        # Creates the directories, and lists the files to copy
+        to_copy = [(self, target)]
+        while to_copy:
+            src_dir, dst_dir = to_copy.pop()
+            directories.append((src_dir, dst_dir))
+            try:
+                names = fs.listdir(src_dir.path)
+            except OSError as e:
+                errors.append((src_dir.path, dst_dir.path, str(e)))
+                continue
+            for name in names:
+                src = src_dir / name
+                dst = dst_dir / name
+                try:
+                    st = fs.lstat(src.path)
+                    if stat.S_ISLNK(st.st_mode):
+                        if symlinks:
+                            fs.symlink(fs.readlink(src.path), dst.path)
+                            if PY3 and fs.native:
+                                shutil.copystat(src.path, dst.path,
+                                                follow_symlinks=False)
+                            continue
+                        st = fs.stat(src.path)
+                    if stat.S_ISDIR(st.st_mode):
+                        fs.mkdir(dst.path)
+                        to_copy.append((src, dst))
+                    elif not stat.S_ISREG(st.st_mode):
+                        raise shutil.SpecialFileError(
+                            "%r is not a regular file" % src.path)
+                    else:
+                        files.append((src, dst, st.st_size))
+                        total_bytes += st.st_size
+                except (EnvironmentError, shutil.Error) as e:
+                    errors.append((src.path, dst.path, str(e)))
+
+        # Copies the files
+        def copy_file(item):
+            src, dst, size = item
+            used = fs.copyfile(src.path, dst.path, strategy, sparse)
+            fs.copystat(src.path, dst.path)
+            return used
+
+        used = collections.Counter()
+        start = time.time()
+        done_files = done_bytes = 0
+        for (src, dst, size), error, strategy_used in threaded_map(
+                copy_file, files, workers, ordered=False):
+            if error is not None:
+                if not isinstance(error, (EnvironmentError, shutil.Error)):
+                    raise error
+                errors.append((src.path, dst.path, str(error)))
+                continue
+            used[strategy_used] += 1
+            done_files += 1
+            done_bytes += size
+            if progress is not None:
+                progress(CopyProgress(done_files, len(files),
+                                      done_bytes, total_bytes,
+                                      time.time() - start))
+
+        # Sets the times of the directories, now that we're done writing them
+        for src, dst in reversed(directories):
+            try:
+                fs.copystat(src.path, dst.path)
+            except OSError as e:
+                errors.append((src.path, dst.path, str(e)))
+        if errors:
+            raise shutil.Error(errors)
+        return used
+
+    def sync_to(self, target, delete=False, compare='size+mtime',
+                workers=None, link_dest=None, strategy=None,
+                modify_window=0):
+        """Makes the `target` directory a copy of this one, incrementally.
+
+        Only the files that are new or changed are copied, using the fastest
+        method available (see :meth:`~rpaths.Path.copyfile`). Symbolic links
+        are copied as links. Permissions and times are copied, and updated on
+        the files whose content didn't change.
+
+        :param delete: If True, files in the target that don't exist here are
+            deleted.
+
+        :param compare: How to tell whether a file changed: ``'size+mtime'``
+            (the default) compares the size and modification time, ``'hash'``
+            compares the size and the content's SHA-256.
+
+        :param workers: Number of threads used to compare and copy files.
+
+        :param link_dest: A directory containing a previous copy of the tree.
+            Files that are unchanged there are hard-linked from it instead of
+            being copied.
+
+        :param modify_window: Modification times that differ by at most this
+            many seconds are considered equal (like rsync's option of the same
+            name). Use 1 or 2 for filesystems with coarse timestamps, such as
+            FAT. Times are always compared to the microsecond on Python 2,
+            where they are set as floats.
+
+        Returns a :class:`~rpaths.SyncSummary` tuple ``(copied, linked,
+        deleted, unchanged)``, where the first three are lists of relative
+        paths and `unchanged` is a number of files. If some files can't be
+        synchronized, the others still are, then :class:`shutil.Error` is
+        raised with the list of errors.
         """
-        shutil.copytree(self.path, self._to_backend(target), symlinks)
+        if compare not in ('size+mtime', 'hash'):
+            raise ValueError("compare should be 'size+mtime' or 'hash', got "
+                             "%r" % compare)
+        target = self.__class__(target)
+        if link_dest is not None:
+            link_dest = self.__class__(link_dest)
+        copied = []
+        linked = []
+        deleted = []
+        errors = []
+        directories = []
+        files = []
+        window_ns = int(modify_window * 1000000000)
+        if not PY3:
+            # os.utime() only sets microseconds and the float times are
+            # rounded, so copied times can be off by a little more than 1us
+            window_ns = max(window_ns, 2000)
+
+        def same_mtime(src_st, other_st):
+            return abs(stat_time_ns(src_st, 'mtime') -
+                       stat_time_ns(other_st, 'mtime')) <= window_ns
+
+        def remove(path, st):
+            if stat.S_ISDIR(st.st_mode):
+                shutil.rmtree(path.path)
+            else:
+                os.remove(path.path)
+
+        def same_meta(src_st, other_st):
+            return (stat.S_IMODE(src_st.st_mode) ==
+                    stat.S_IMODE(other_st.st_mode) and
+                    same_mtime(src_st, other_st))
+
+        def list_dir(path):
+            entries = {}
+            for name in os.listdir(path.path):
+                try:
+                    entries[name] = os.lstat((path / name).path)
+                except OSError:
+                    pass
+            return entries
+
+        # Walks both trees, syncing directories and links and listing files
+        if not target.exists():
+            os.makedirs(target.path)
+        to_sync = [(self, target, self.__class__(''))]
+        while to_sync:
+            src_dir, dst_dir, rel_dir = to_sync.pop()
+            directories.append((src_dir, dst_dir))
+            try:
+                src_entries = list_dir(src_dir)
+                dst_entries = list_dir(dst_dir)
+            except OSError as e:
+                errors.append((src_dir.path, dst_dir.path, str(e)))
+                continue
+            for name, src_st in src_entries.items():
+                src = src_dir / name
+                dst = dst_dir / name
+                rel = rel_dir / name
+                dst_st = dst_entries.get(name)
+                try:
+                    if stat.S_ISDIR(src_st.st_mode):
+                        if dst_st is not None and \
+                                not stat.S_ISDIR(dst_st.st_mode):
+                            remove(dst, dst_st)
+                            dst_st = None
+                        if dst_st is None:
+                            os.mkdir(dst.path)
+                            copied.append(rel)
+                        to_sync.append((src, dst, rel))
+                    elif stat.S_ISLNK(src_st.st_mode):
+                        link = os.readlink(src.path)
+                        if dst_st is not None:
+                            if (stat.S_ISLNK(dst_st.st_mode) and
+                                    os.readlink(dst.path) == link):
+                                if PY3 and not same_meta(src_st, dst_st):
+                                    shutil.copystat(src.path, dst.path,
+                                                    follow_symlinks=False)
+                                continue
+                            remove(dst, dst_st)
+                        os.symlink(link, dst.path)
+                        if PY3:
+                            shutil.copystat(src.path, dst.path,
+                                            follow_symlinks=False)
+                        copied.append(rel)
+                    elif not stat.S_ISREG(src_st.st_mode):
+                        raise shutil.SpecialFileError(
+                            "%r is not a regular file" % src.path)
+                    else:
+                        if dst_st is not None and \
+                                stat.S_ISDIR(dst_st.st_mode):
+                            remove(dst, dst_st)
+                            dst_st = None
+                        files.append((src, dst, rel, src_st, dst_st))
+                except (EnvironmentError, shutil.Error) as e:
+                    errors.append((src.path, dst.path, str(e)))
+            if delete:
+                for name, dst_st in dst_entries.items():
+                    if name not in src_entries:
+                        try:
+                            remove(dst_dir / name, dst_st)
+                        except (EnvironmentError, shutil.Error) as e:
+                            errors.append((None, (dst_dir / name).path,
+                                           str(e)))
+                        else:
+                            deleted.append(rel_dir / name)
+
+        def same(src, src_st, other, other_st):
+            if (not stat.S_ISREG(other_st.st_mode) or
+                    src_st.st_size != other_st.st_size):
+                return False
+            if compare == 'hash':
+                return (src._digest('sha256', None) ==
+                        other._digest('sha256', None))
+            else:
+                return same_mtime(src_st, other_st)
+
+        # Compares and copies files, possibly in parallel
+        def sync_file(item):
+            src, dst, rel, src_st, dst_st = item
+            if dst_st is not None:
+                if same(src, src_st, dst, dst_st):
+                    if same_meta(src_st, dst_st):
+                        return None
+                    # Don't change the metadata of a hard-linked copy
+                    if dst_st.st_nlink == 1:
+                        shutil.copystat(src.path, dst.path)
+                        return None
+                # Remove first, the target might be a hard link
+                os.remove(dst.path)
+            if link_dest is not None:
+                other = link_dest / rel
+                try:
+                    other_st = os.lstat(other.path)
+                except OSError:
+                    pass
+                else:
+                    if (same(src, src_st, other, other_st) and
+                            same_meta(src_st, other_st)):
+                        os.link(other.path, dst.path)
+                        return 'linked'
+            copy_file_contents(src.path, dst.path, strategy)
+            shutil.copystat(src.path, dst.path)
+            return 'copied'
+
+        unchanged = 0
+        for item, error, action in threaded_map(sync_file, files, workers,
+                                                ordered=False):
+            if error is not None:
+                if not isinstance(error, (EnvironmentError, shutil.Error)):
+                    raise error
+                errors.append((item[0].path, item[1].path, str(error)))
+            elif action == 'copied':
+                copied.append(item[2])
+            elif action == 'linked':
+                linked.append(item[2])
+            else:
+                unchanged += 1
 
-    def rmtree(self, ignore_errors=False):
+        for src, dst in reversed(directories):
+            try:
+                shutil.copystat(src.path, dst.path)
+            except OSError as e:
+                errors.append((src.path, dst.path, str(e)))
+        if errors:
+            raise shutil.Error(errors)
+        return SyncSummary(copied, linked, deleted, unchanged)
+
+    def rmtree(self, ignore_errors=False, workers=None):
         """Deletes an entire directory.
 
         If ignore_errors is True, failed removals will be ignored; else,
         an exception will be raised.
+
+        :param workers: If set, and the system supports it, the files are
+            removed relative to open directory descriptors (no path lookup for
+            each file), and each subdirectory is handed to a pool of that many
+            threads as soon as it is found, so that deep or lopsided trees are
+            removed in parallel too. Symbolic links are never followed. If
+            some files can't be removed, the others still are, then
+            :class:`shutil.Error` is raised with the list of errors (as
+            :exc:`OSError` objects with full paths).
         """
-        shutil.rmtree(self.path, ignore_errors)
+        if (workers is None or not DIR_FD_SUPPORTED or not self._fs.native or
+                futures is None or os.path.islink(self.path)):
+            self._fs.rmtree(self.path, ignore_errors)
+            return
+
+        try:
+            root_fd = os.open(self.path, _O_DIR_NOFOLLOW)
+        except OSError:
+            if ignore_errors:
+                return
+            raise
+
+        errors = []
+        failures = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def onerror(e, path):
+            if not ignore_errors:
+                with lock:
+                    errors.append(OSError(e.errno, e.strerror, path.path))
+
+        def finish(node):
+            # Removes a directory once its content is gone, then its parents
+            # if they are done too
+            while node is not None:
+                fd, parent, name, path = node[:4]
+                with lock:
+                    node[4] -= 1
+                    if node[4]:
+                        return
+                os.close(fd)
+                try:
+                    if parent is None:
+                        os.rmdir(path.path)
+                    else:
+                        os.rmdir(name, dir_fd=parent[0])
+                except OSError as e:
+                    onerror(e, path)
+                node = parent
+            done.set()
+
+        def remove_dir(parent, name, path):
+            # Nodes are [fd, parent, name, path, pending], where pending counts
+            # this directory's listing and its subdirectories being removed
+            if parent is None:
+                fd = root_fd
+            else:
+                try:
+                    fd = os.open(name, _O_DIR_NOFOLLOW, dir_fd=parent[0])
+                except OSError as e:
+                    onerror(e, path)
+                    finish(parent)
+                    return
+            node = [fd, parent, name, path, 1]
+            try:
+                entries = list(os.scandir(fd))
+            except OSError as e:
+                onerror(e, path)
+                entries = []
+            for entry in entries:
+                child = path / entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    with lock:
+                        node[4] += 1
+                    executor.submit(run, node, entry.name, child)
+                else:
+                    try:
+                        os.unlink(entry.name, dir_fd=fd)
+                    except OSError as e:
+                        onerror(e, child)
+            finish(node)
+
+        def run(*args):
+            try:
+                remove_dir(*args)
+            except BaseException as e:
+                failures.append(e)
+                done.set()
+
+        executor = futures.ThreadPoolExecutor(workers)
+        try:
+            executor.submit(run, None, None, self)
+            done.wait()
+        finally:
+            executor.shutdown()
+        if failures:
+            raise failures[0]
+        if errors:
+            raise shutil.Error(errors)
 
     def move(self, target):
         """Recursively moves a file or directory to the given target location.
         """
-        shutil.move(self.path, self._to_backend(target))
+        self._fs.move(self.path, self._to_backend(target))
+
+    @classmethod
+    def _plan_moves(cls, pairs):
+        ops = []
+        sources = set()
+        destinations = set()
+        devices = {}
+
+        def device(path):
+            # Device of the nearest existing directory
+            if path not in devices:
+                try:
+                    devices[path] = os.stat(path.path).st_dev
+                except OSError:
+                    if path.parent == path:
+                        raise
+                    devices[path] = device(path.parent)
+            return devices[path]
+
+        for src, dst in pairs:
+            src = cls(src).absolute()
+            dst = cls(dst).absolute()
+            if src == dst:
+                continue
+            if src in sources:
+                raise ValueError("%s is moved twice" % src)
+            if dst in destinations:
+                raise ValueError("Multiple paths are moved to %s" % dst)
+            if dst.lies_under(src):
+                raise ValueError("Can't move %s into itself" % src)
+            sources.add(src)
+            destinations.add(dst)
+            if os.lstat(src.path).st_dev == device(dst.parent):
+                ops.append(('rename', src, dst))
+            else:
+                ops.append(('copy', src, dst))
+        for kind, src, dst in ops:
+            if dst not in sources and dst.lexists():
+                raise OSError(errno.EEXIST, "Destination exists", dst.path)
+
+        levels, stuck = _order_moves(ops)
+        if stuck:
+            # Break cycles (like swaps) by moving to a temporary name first
+            temps = set()
+            for i in stuck:
+                kind, src, dst = ops[i]
+                temp = _move_temp(dst)
+                temps.add(temp)
+                ops[i] = kind, src, temp
+                ops.append(('rename', temp, dst))
+            levels, stuck = _order_moves(ops, temps)
+            if stuck:
+                raise ValueError("Moves can't be ordered, destinations are "
+                                 "nested inside each other's sources")
+        return [[ops[i] for i in level] for level in levels]
+
+    @classmethod
+    def bulk_move(cls, mapping, journal=None, workers=None, rollback=True):
+        """Moves many files and directories, ordering the operations safely.
+
+        `mapping` is a dictionary (or an iterable of pairs) from source to
+        destination paths. Missing parent directories of the destinations are
+        created. Existing destinations are only replaced if they are moved
+        themselves, so chains (``a -> b, b -> c``) and cycles
+        (``a -> b, b -> a``, through a temporary name) work as expected.
+
+        Entries on the same filesystem as their destination are renamed; others
+        are copied (to a temporary name next to the destination, then renamed
+        into place) and then removed. The operations are grouped into levels,
+        and the operations of a level, which don't depend on each other, are
+        run in parallel by `workers` threads.
+
+        :param journal: If set, the plan is written to that file (as JSON
+            lines) before anything is moved, followed by a line for each
+            completed operation. If the process is interrupted,
+            :meth:`resume_bulk_move` can then finish the job.
+
+        :param rollback: If True (the default), the operations that were done
+            are reverted if one of them fails.
+
+        Returns a :class:`collections.Counter` with the number of ``'rename'``
+        and ``'copy'`` operations. If some operations fail, a
+        :exc:`shutil.Error` is raised with the list of failures.
+        """
+        if hasattr(mapping, 'items'):
+            mapping = mapping.items()
+        ops = []
+        for n, level in enumerate(cls._plan_moves(mapping)):
+            for kind, src, dst in level:
+                ops.append((n, kind, src, dst))
+        if journal is None:
+            return cls._run_moves(ops, [], None, workers, rollback)
+        with cls(journal).open('w', encoding='utf-8', newline='\n') as fp:
+            for i, (level, kind, src, dst) in enumerate(ops):
+                _journal_write(fp, {'op': i, 'level': level, 'kind': kind,
+                                    'src': _journal_encode(src),
+                                    'dst': _journal_encode(dst)})
+            return cls._run_moves(ops, [], fp, workers, rollback)
+
+    @classmethod
+    def resume_bulk_move(cls, journal, workers=None, rollback=True):
+        """Finishes a :meth:`bulk_move` that was interrupted, from its journal.
+
+        The operations that were not recorded as done are run (checking first
+        whether the ones that were in progress actually completed). If the
+        move was being rolled back, the rollback is finished instead.
+
+        Returns the same counter as :meth:`bulk_move` (for the operations run
+        by this call).
+        """
+        journal = cls(journal)
+        ops = {}
+        done = []
+        undone = set()
+        with journal.open('r', encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Last line might have been cut short
+                if 'op' in entry:
+                    ops[entry['op']] = (entry['level'], entry['kind'],
+                                        _journal_decode(cls, entry['src']),
+                                        _journal_decode(cls, entry['dst']))
+                elif 'done' in entry:
+                    done.append(entry['done'])
+                elif 'undone' in entry:
+                    undone.add(entry['undone'])
+        ops = [ops[i] for i in range(len(ops))]
+
+        with journal.open('a', encoding='utf-8', newline='\n') as fp:
+            if undone:
+                errors = cls._undo_moves(ops, [i for i in done
+                                               if i not in undone], fp)
+                if errors:
+                    raise shutil.Error(errors)
+                return collections.Counter()
+
+            # Operations can only have been in progress in the first level
+            # that is not complete
+            done_set = set(done)
+            pending = [level for i, (level, kind, src, dst) in enumerate(ops)
+                       if i not in done_set]
+            if pending:
+                current = min(pending)
+                for i, (level, kind, src, dst) in enumerate(ops):
+                    if level != current or i in done_set:
+                        continue
+                    if kind == 'rename':
+                        finished = not src.lexists() and dst.lexists()
+                    else:
+                        # The copy was complete, the source might remain
+                        finished = dst.lexists()
+                        if finished and src.lexists():
+                            _remove_any(src)
+                    if finished:
+                        done.append(i)
+                        _journal_write(fp, {'done': i})
+            return cls._run_moves(ops, done, fp, workers, rollback)
+
+    @classmethod
+    def _run_moves(cls, ops, done, journal_fp, workers, rollback):
+        counts = collections.Counter()
+        done = list(done)
+        done_set = set(done)
+        levels = {}
+        for i, (level, kind, src, dst) in enumerate(ops):
+            if i not in done_set:
+                levels.setdefault(level, []).append(i)
+
+        def run(i):
+            level, kind, src, dst = ops[i]
+            _move_one(kind, src, dst)
+
+        for level in sorted(levels):
+            errors = []
+            for i, error, result in threaded_map(run, levels[level], workers,
+                                                 ordered=False):
+                if error is not None:
+                    errors.append((ops[i][2].path, ops[i][3].path,
+                                   str(error)))
+                else:
+                    done.append(i)
+                    counts[ops[i][1]] += 1
+                    _journal_write(journal_fp, {'done': i})
+            if errors:
+                if rollback:
+                    errors.extend(cls._undo_moves(ops, done, journal_fp))
+                raise shutil.Error(errors)
+        return counts
+
+    @staticmethod
+    def _undo_moves(ops, done, journal_fp):
+        errors = []
+        for i in reversed(done):
+            level, kind, src, dst = ops[i]
+            try:
+                _move_one(kind, dst, src)
+            except (OSError, IOError, shutil.Error) as e:
+                errors.append((dst.path, src.path, str(e)))
+            else:
+                _journal_write(journal_fp, {'undone': i})
+        return errors
 
     def open(self, mode='r', name=None, **kwargs):
         """Opens this file, or a file under this directory.
@@ -951,9 +4928,542 @@ class Path(DefaultAbstractPath):
             file.
         """
         if name is not None:
-            return io.open((self / name).path, mode=mode, **kwargs)
+            return self._fs.open((self / name).path, mode, **kwargs)
+        else:
+            return self._fs.open(self.path, mode, **kwargs)
+
+    def iter_chunks(self, size=COPY_BUFFER_SIZE, buffer=None):
+        """Reads this file in chunks, reusing a single buffer.
+
+        This yields :class:`memoryview` objects, which are only valid until
+        the next one is requested; nothing is allocated after the buffer.
+
+        :param size: The size of the chunks, if `buffer` is not given.
+
+        :param buffer: A :class:`bytearray` (or other writable buffer) to read
+            into. By default, a new one of `size` bytes is created.
+        """
+        if buffer is None:
+            buffer = bytearray(size)
+        view = memoryview(buffer)
+        with self.open('rb', buffering=0) as fp:
+            if self._fs.native:
+                _advise_sequential(fp.fileno())
+            while True:
+                read = fp.readinto(buffer)
+                if not read:
+                    break
+                yield view[:read]
+
+    def _digest(self, algorithm, cache, st=None):
+        """Computes the digest of this file, going through the cache.
+        """
+        if cache is not None:
+            if st is None:
+                st = os.stat(self.path)
+            digest = cache.get(st, algorithm)
+            if digest is not None:
+                return digest
+        h = hashlib.new(algorithm)
+        for chunk in self.iter_chunks():
+            h.update(chunk)
+        digest = h.digest()
+        if cache is not None:
+            cache.set(st, algorithm, digest)
+        return digest
+
+    @contextlib.contextmanager
+    def _hash_cache(self, cache):
+        if cache is None or isinstance(cache, HashCache):
+            yield cache
         else:
-            return io.open(self.path, mode=mode, **kwargs)
+            with HashCache(cache) as cache:
+                yield cache
+
+    def hash(self, algorithm='sha256', cache=None):
+        """Computes the digest of this file's content.
+
+        Returns the hexadecimal digest.
+
+        :param algorithm: A name of algorithm accepted by :func:`hashlib.new`.
+
+        :param cache: A :class:`~rpaths.HashCache`, or the path to its
+            database. If the file didn't change since its digest was recorded
+            there, it is not read again.
+        """
+        with self._hash_cache(cache) as cache:
+            return codecs.encode(self._digest(algorithm, cache),
+                                 'hex').decode('ascii')
+
+    def hash_tree(self, algorithm='sha256', workers=None, cache=None):
+        """Computes the digests of all the files under this directory.
+
+        Directories are hashed from the names, types and digests of their
+        entries, forming a Merkle tree; symbolic links are hashed from their
+        target and are not followed.
+
+        With a `cache` (see :meth:`~rpaths.Path.hash`), only the files that
+        changed are read. The digests of directories are cached as well, keyed
+        on a fingerprint of their entries' metadata, so that after a change,
+        only the directories containing it are hashed again. The whole tree
+        is still listed and stat'ed on each call, since changing a file
+        doesn't update the modification time of its directory.
+
+        Returns a pair ``(digest, digests)`` where `digest` is the digest of
+        this directory and `digests` is a dictionary mapping the relative
+        paths of all the files and directories to theirs (hexadecimal).
+
+        :param workers: Number of threads used to read files.
+        """
+        directories = []
+        files = []
+        to_list = [(self, self.__class__(''), os.lstat(self.path))]
+        while to_list:
+            directory, rel, dir_st = to_list.pop()
+            children = []
+            directories.append((rel, dir_st, children))
+            for name in sorted(os.listdir(directory.path)):
+                child = directory / name
+                child_rel = rel / name
+                st = os.lstat(child.path)
+                if stat.S_ISDIR(st.st_mode):
+                    kind = b'd'
+                    key = None
+                    to_list.append((child, child_rel, st))
+                elif stat.S_ISLNK(st.st_mode):
+                    kind = b'l'
+                    key = os.readlink(child.path)
+                    if not isinstance(key, bytes):
+                        key = key.encode('utf-8')
+                elif stat.S_ISREG(st.st_mode):
+                    kind = b'f'
+                    key = ('%d %d %d %d' % (
+                        st.st_dev, st.st_ino, st.st_size,
+                        stat_time_ns(st, 'mtime'))).encode('ascii')
+                    files.append((child, child_rel, st))
+                else:
+                    raise shutil.SpecialFileError(
+                        "%r is not a regular file" % child.path)
+                if not isinstance(name, bytes):
+                    name = name.encode('utf-8')
+                children.append((name, kind, child_rel, key))
+
+        digests = {}
+        fingerprints = {}
+        with self._hash_cache(cache) as cache:
+            for (child, rel, st), error, digest in threaded_map(
+                    lambda f: f[0]._digest(algorithm, cache, f[2]),
+                    files, workers, ordered=False):
+                if error is not None:
+                    raise error
+                digests[rel] = digest
+
+            # Parents come before their children in the list
+            for rel, dir_st, children in reversed(directories):
+                fingerprint = hashlib.sha256()
+                for name, kind, child_rel, key in children:
+                    if kind == b'l':
+                        digests[child_rel] = hashlib.new(algorithm,
+                                                         key).digest()
+                    elif kind == b'd':
+                        key = fingerprints[child_rel]
+                    fingerprint.update(kind + name + b'\0' + key + b'\0')
+                fingerprint = fingerprints[rel] = fingerprint.digest()
+                digest = None
+                if cache is not None and dir_st.st_ino:
+                    digest = cache.get_directory(dir_st, algorithm,
+                                                 fingerprint)
+                if digest is None:
+                    h = hashlib.new(algorithm)
+                    for name, kind, child_rel, key in children:
+                        h.update(kind + name + b'\0' + digests[child_rel])
+                    digest = h.digest()
+                    if cache is not None and dir_st.st_ino:
+                        cache.set_directory(dir_st, algorithm, fingerprint,
+                                            digest)
+                digests[rel] = digest
+        root_digest = digests.pop(self.__class__(''))
+        hexdigest = lambda d: codecs.encode(d, 'hex').decode('ascii')
+        return (hexdigest(root_digest),
+                dict((k, hexdigest(v)) for k, v in digests.items()))
+
+    def _partial_digest(self, size, algorithm, block=4096):
+        """Hashes the first and last blocks of this file.
+        """
+        h = hashlib.new(algorithm)
+        with self.open('rb', buffering=0) as fp:
+            h.update(fp.read(block))
+            if size > block:
+                fp.seek(max(block, size - block))
+                h.update(fp.read(block))
+        return h.digest()
+
+    def find_duplicates(self, pattern=None, workers=None, min_size=1,
+                        algorithm='sha256', cache=None):
+        """Finds files with identical content under this directory.
+
+        This yields lists of paths as soon as they are confirmed to have the
+        same content. Files are first grouped by size (which is known from the
+        traversal), then by a hash of their first and last blocks, and only the
+        remaining candidates are read in full. Hard links to the same file are
+        only considered once. Symbolic links are not followed.
+
+        :param pattern: Only consider the files matching this pattern (see
+            :meth:`~rpaths.Path.recursedir`).
+
+        :param workers: Number of threads used to read files.
+
+        :param min_size: Ignore files smaller than this. By default, empty
+            files are ignored.
+
+        :param cache: A :class:`~rpaths.HashCache`, or the path to its
+            database (see :meth:`~rpaths.Path.hash`).
+        """
+        block = 4096
+
+        # Group by size
+        by_size = {}
+        seen = set()
+        for path, info in self.recursedir(pattern, type='f',
+                                          min_size=min_size, with_info=True):
+            if info.inode:
+                if (info.device, info.inode) in seen:
+                    continue
+                seen.add((info.device, info.inode))
+            by_size.setdefault(info.size, []).append(path)
+        del seen
+        candidates = [(path, size)
+                      for size, paths in by_size.items() if len(paths) > 1
+                      for path in paths]
+        del by_size
+
+        # Group by the beginning and end of the files
+        groups = {}
+        for (path, size), error, digest in threaded_map(
+                lambda c: c[0]._partial_digest(c[1], algorithm, block),
+                candidates, workers, ordered=False):
+            if error is not None:
+                if not isinstance(error, EnvironmentError):
+                    raise error
+                continue
+            groups.setdefault((size, digest), []).append(path)
+        del candidates
+        candidates = []
+        for (size, digest), paths in groups.items():
+            if len(paths) < 2:
+                continue
+            elif size <= 2 * block:
+                # Already read in full, with the requested algorithm
+                yield sorted(paths)
+            else:
+                candidates.extend((path, (size, digest)) for path in paths)
+
+        # Hash the remaining candidates in full
+        remaining = dict((key, len(paths)) for key, paths in groups.items())
+        full = dict((key, {}) for key in remaining)
+        with self._hash_cache(cache) as cache:
+            for (path, key), error, digest in threaded_map(
+                    lambda c: c[0]._digest(algorithm, cache), candidates,
+                    workers, ordered=False):
+                if error is not None:
+                    if not isinstance(error, EnvironmentError):
+                        raise error
+                else:
+                    full[key].setdefault(digest, []).append(path)
+                remaining[key] -= 1
+                if remaining[key] == 0:
+                    for paths in full.pop(key).values():
+                        if len(paths) > 1:
+                            yield sorted(paths)
+
+    def read_bytes(self):
+        """Returns the entire content of this file as bytes.
+
+        The buffer is allocated once, from the file's size.
+        """
+        with self.open('rb', buffering=0) as fp:
+            if not self._fs.native:
+                return fp.read()
+            _advise_sequential(fp.fileno())
+            return _read_whole(fp)
+
+    def read_text(self, encoding=None, errors=None):
+        """Returns the entire content of this file as unicode.
+
+        Like :func:`io.open` in text mode, the encoding defaults to the
+        locale's preferred encoding, and universal newlines are used.
+        """
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        text = self.read_bytes().decode(encoding, errors or 'strict')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    @classmethod
+    def read_many(cls, paths, mode='rb', workers=8, max_bytes=64 * 1024 * 1024,
+                  encoding=None, errors=None, handle_errors=None):
+        """Reads the content of many files, issuing the reads concurrently.
+
+        This yields pairs ``(path, content)`` as the reads complete (so not
+        necessarily in the order of `paths`). It is much faster than reading
+        the files one by one when the latency of each call is high, for
+        instance with lots of small files on a network filesystem.
+
+        :param paths: The files to read. This can be any iterable, and is
+            consumed lazily.
+
+        :param mode: ``'rb'`` (the default) to get bytes, or ``'r'`` to get
+            unicode (decoded like :meth:`~rpaths.Path.read_text`, using
+            `encoding` and `errors`).
+
+        :param workers: The number of threads issuing the reads.
+
+        :param max_bytes: The maximum size of the content that has been read
+            but not yet consumed; workers wait before reading more. A single
+            file larger than this is still read, on its own.
+
+        :param handle_errors: Can be set to a callback that will be called when
+            an error is encountered while reading a file, in which case the
+            path will not be yielded. If set to None (the default), the
+            exception is yielded in place of the content.
+        """
+        if mode not in ('r', 'rb', 'rt'):
+            raise ValueError("mode should be 'r' or 'rb', got %r" % mode)
+        text = 'b' not in mode
+        if text and encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        budget = _ByteBudget(max_bytes)
+
+        def read(path):
+            with path.open('rb', buffering=0) as fp:
+                size = os.fstat(fp.fileno()).st_size
+                budget.acquire(size)
+                try:
+                    data = _read_whole(fp, size)
+                except Exception:
+                    budget.release(size)
+                    raise
+            if text:
+                try:
+                    data = data.decode(encoding, errors or 'strict')
+                except Exception:
+                    budget.release(size)
+                    raise
+                data = data.replace('\r\n', '\n').replace('\r', '\n')
+            return size, data
+
+        results = threaded_map(read, (cls(p) for p in paths),
+                               workers=workers, ordered=False)
+        try:
+            for path, error, result in results:
+                if error is not None:
+                    if not isinstance(error, (OSError, IOError,
+                                              UnicodeDecodeError)):
+                        raise error
+                    if handle_errors is not None:
+                        handle_errors(path.path)
+                        continue
+                    yield path, error
+                else:
+                    size, data = result
+                    budget.release(size)
+                    yield path, data
+        finally:
+            # Unblocks workers waiting for budget, so the pool can shut down
+            budget.close()
+            results.close()
+
+    @contextlib.contextmanager
+    def mmap(self, access='r', offset=0, length=None, advice=None):
+        """Maps this file in memory.
+
+        This context manager gives a :class:`memoryview` of the file's content,
+        without copying it. The view is released at the end of the context;
+        views derived from it (such as slices) must not outlive the context
+        either, or the file can't be unmapped and :exc:`BufferError` is
+        raised. Copy the data with :meth:`memoryview.tobytes` to keep it.
+
+        This needs Python 3, as mmap objects don't support :class:`memoryview`
+        on Python 2.
+
+        :param access: ``'r'`` for read-only access (the default), ``'w'`` to
+            write changes back to the file, or ``'c'`` for copy-on-write
+            access (changes are not written to the file).
+
+        :param offset: Where to start mapping in the file. It doesn't need to
+            be a multiple of :data:`mmap.ALLOCATIONGRANULARITY`.
+
+        :param length: How many bytes to map. By default, up to the end of the
+            file.
+
+        :param advice: ``'sequential'``, ``'random'`` or ``'willneed'``, or a
+            list of those, to tell the kernel how the memory will be accessed.
+            This is ignored if :meth:`mmap.mmap.madvise` is not available.
+        """
+        if not PY3:
+            raise RuntimeError("mmap() needs Python 3")
+        try:
+            prot = {'r': mmap.ACCESS_READ, 'w': mmap.ACCESS_WRITE,
+                    'c': mmap.ACCESS_COPY}[access]
+        except KeyError:
+            raise ValueError("access should be 'r', 'w' or 'c', got %r" %
+                             access)
+        with self.open('r+b' if access == 'w' else 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if offset > size:
+                raise ValueError("offset is past the end of the file")
+            if length is None:
+                length = size - offset
+            if length == 0:
+                # mmap() doesn't allow empty mappings
+                yield memoryview(bytearray() if access != 'r' else b'')
+                return
+            skip = offset % mmap.ALLOCATIONGRANULARITY
+            mapped = mmap.mmap(fp.fileno(), length + skip, access=prot,
+                               offset=offset - skip)
+        try:
+            if advice is not None and hasattr(mapped, 'madvise'):
+                if isinstance(advice, backend_types):
+                    advice = [advice]
+                for name in advice:
+                    flag = getattr(mmap, 'MADV_' + name.upper(), None)
+                    if flag is not None:
+                        mapped.madvise(flag)
+            view = memoryview(mapped)
+            try:
+                if skip:
+                    inner = view[skip:]
+                    try:
+                        yield inner
+                    finally:
+                        inner.release()
+                else:
+                    yield view
+            finally:
+                view.release()
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                raise BufferError("Views of the mapping of %s are still in "
+                                  "use after the end of mmap()" % self)
+
+    def aopen(self, mode='r', name=None, executor=None,
+              chunk_size=COPY_BUFFER_SIZE, **kwargs):
+        """Opens this path asynchronously.
+
+        Returns an :class:`~rpaths.AsyncFile`, to be awaited or used with
+        ``async with``::
+
+            async with path.aopen('rb') as fp:
+                async for chunk in fp:
+                    process(chunk)
+
+        Arguments are the same as :meth:`~rpaths.Path.open`; the file is opened
+        and accessed on `executor` (by default, the one returned by
+        :meth:`~rpaths.AsyncExecutor.get_default`).
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return AsyncFile(lambda: self.open(mode, name, **kwargs), executor,
+                         chunk_size)
+
+    def astat(self, follow_links=True, executor=None):
+        """Gets the stat result for this path asynchronously.
+
+        Returns an :class:`asyncio.Future`. This is :func:`os.stat` (or
+        :func:`os.lstat` if `follow_links` is False) running on `executor`.
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return executor.run(os.stat if follow_links else os.lstat, self.path)
+
+    def aremove(self, executor=None):
+        """Removes this file asynchronously, returns an
+        :class:`asyncio.Future`.
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return executor.run(self.remove)
+
+    def _read_steps(self, chunk_size):
+        with self.open('rb', buffering=0) as fp:
+            _advise_sequential(fp.fileno())
+            buf = bytearray(os.fstat(fp.fileno()).st_size)
+            view = memoryview(buf)
+            pos = 0
+            while pos < len(buf):
+                yield
+                read = fp.readinto(view[pos:pos + chunk_size])
+                if not read:
+                    del view
+                    del buf[pos:]
+                    break
+                pos += read
+            else:
+                del view
+            yield
+            rest = fp.readall()
+        data = bytes(buf)
+        if rest:
+            data += rest
+        yield data
+
+    def aread_bytes(self, executor=None, chunk_size=COPY_BUFFER_SIZE):
+        """Reads this file asynchronously, returns an :class:`asyncio.Future`
+        for its content.
+
+        The file is read in chunks of `chunk_size` bytes, each one a separate
+        call on `executor`, so that big files don't hold a thread for long and
+        cancelling stops the read promptly.
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return _run_steps(executor, self._read_steps(chunk_size))
+
+    def _write_steps(self, data, chunk_size):
+        view = memoryview(data)
+        with self.open('wb') as fp:
+            for pos in range(0, len(view), chunk_size):
+                yield
+                fp.write(view[pos:pos + chunk_size])
+
+    def awrite_bytes(self, data, executor=None, chunk_size=COPY_BUFFER_SIZE):
+        """Writes bytes to this file asynchronously.
+
+        Returns an :class:`asyncio.Future`. Like :meth:`aread_bytes`, the data
+        is written in chunks; if cancelled, the file is left partially
+        written.
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return _run_steps(executor, self._write_steps(data, chunk_size))
+
+    def _copy_steps(self, target, chunk_size):
+        target = self.__class__(target)
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        with self.open('rb', buffering=0) as src:
+            _advise_sequential(src.fileno())
+            with target.open('wb', buffering=0) as dst:
+                while True:
+                    yield
+                    read = src.readinto(buf)
+                    if not read:
+                        break
+                    pos = 0
+                    while pos < read:
+                        pos += dst.write(view[pos:read])
+
+    def acopyfile(self, target, executor=None, chunk_size=COPY_BUFFER_SIZE):
+        """Copies this file to the given `target` location, asynchronously.
+
+        Returns an :class:`asyncio.Future`. Like :meth:`copyfile`, only the
+        content is copied. The copy happens in chunks of `chunk_size` bytes on
+        `executor`; if cancelled, the target is left partially written.
+        """
+        if executor is None:
+            executor = AsyncExecutor.get_default()
+        return _run_steps(executor, self._copy_steps(target, chunk_size))
 
     @contextlib.contextmanager
     def rewrite(self, mode='r', name=None, temp=None, tempext='~', **kwargs):
@@ -1022,8 +5532,99 @@ class Path(DefaultAbstractPath):
                 writable.close()
         # Alright, replace
         pathr.copymode(pathw)
-        pathr.remove()
-        pathw.rename(pathr)
+        _replace(pathw.path, pathr.path)
+
+    @staticmethod
+    def batch_writer(sync='auto'):
+        """Writes many files atomically, flushing them to disk together.
+
+        Returns a :class:`~rpaths.BatchWriter`, to be used as a context
+        manager::
+
+            with Path.batch_writer() as batch:
+                for name, state in states:
+                    with batch.open(statedir / name, 'wb') as fp:
+                        fp.write(state)
+
+        This gives the same guarantees as using :meth:`atomic_write` with
+        ``fsync='file+dir'`` on each file, but flushes each filesystem and
+        directory only once (see :class:`~rpaths.BatchWriter` for the `sync`
+        parameter).
+        """
+        return BatchWriter(sync)
+
+    @contextlib.contextmanager
+    def atomic_write(self, mode='w', name=None, fsync='none', **kwargs):
+        """Writes this file atomically.
+
+        This context manager gives you a file object; at the end of the
+        context, it atomically replaces this file (unless an exception is
+        raised, in which case the file is left unchanged). Readers either see
+        the previous content or the complete new content, and the file always
+        exists if it existed before. The permissions of the previous file are
+        kept.
+
+        On Linux, the new content is written to an unnamed file (O_TMPFILE)
+        which is linked into place at the end. Elsewhere, a temporary file with
+        a unique name is written then renamed over this one.
+
+        Keyword arguments are passed to :func:`io.open`.
+
+        :param name: Path component to append to this path before opening the
+            file.
+
+        :param fsync: ``'none'`` (the default) doesn't wait for the data to
+            reach the disk, ``'file'`` flushes the file's content before it
+            replaces the previous one, and ``'file+dir'`` also flushes the
+            directory so that the replacement itself survives a crash.
+        """
+        if name is not None:
+            target = self / name
+        else:
+            target = self
+        if fsync not in ('none', 'file', 'file+dir'):
+            raise ValueError("fsync should be 'none', 'file' or 'file+dir', "
+                             "got %r" % fsync)
+        for m in 'war+x':
+            mode = mode.replace(m, '')
+        try:
+            previous_mode = stat.S_IMODE(os.stat(target.path).st_mode)
+        except OSError:
+            previous_mode = None
+
+        fd = _open_anonymous(target.parent)
+        if fd is not None:
+            temp = None
+        else:
+            fd, temp = _create_temp_sibling(target)
+        try:
+            fp = io.open(fd, 'w' + mode, **kwargs)
+        except Exception:
+            os.close(fd)
+            if temp is not None:
+                temp.remove()
+            raise
+        try:
+            with fp:
+                yield fp
+                fp.flush()
+                if previous_mode is not None:
+                    if hasattr(os, 'fchmod'):
+                        os.fchmod(fd, previous_mode)
+                    else:
+                        os.chmod(temp.path, previous_mode)
+                if fsync != 'none':
+                    os.fsync(fd)
+                if temp is None:
+                    _link_anonymous(fd, target)
+            if temp is not None:
+                _replace(temp.path, target.path)
+                temp = None
+        finally:
+            if temp is not None:
+                temp.remove()
+        if fsync == 'file+dir':
+            _fsync_dir(target.parent.path)
 
 
 class Pattern(object):
@@ -1,20 +1,36 @@
 from __future__ import unicode_literals
 
+import datetime
+import hashlib
+import json
 import os
+import shutil
 import sys
+import threading
+import time
 try:
     import unittest2 as unittest
 except ImportError:
     import unittest
 
-from rpaths import unicode, dict_union, Path, PosixPath, WindowsPath, \
-    Pattern, pattern2re
+from rpaths import unicode, dict_union, PY3, Path, PosixPath, WindowsPath, \
+    Pattern, pattern2re, COPY_STRATEGIES, AsyncExecutor, TempDirPool, \
+    MemoryFS, HashCache
 
 
 windows_only = unittest.skipUnless(issubclass(Path, WindowsPath),
                                    "Only runs on Windows")
 posix_only = unittest.skipUnless(issubclass(Path, PosixPath),
                                  "Only runs on POSIX")
+try:
+    import asyncio
+    from concurrent import futures
+except ImportError:
+    asyncio = futures = None
+asyncio_only = unittest.skipUnless(asyncio is not None and futures is not None,
+                                   "Needs asyncio and concurrent.futures")
+linux_only = unittest.skipUnless(sys.platform.startswith('linux'),
+                                 "Only runs on Linux")
 
 
 class TestConcrete(unittest.TestCase):
@@ -52,6 +68,167 @@ class TestConcrete(unittest.TestCase):
             f.remove()
             self.assertFalse(f.exists())
 
+    def test_mkdirs(self):
+        """Tests mkdirs()."""
+        tmp = Path.tempdir()
+        try:
+            paths = [tmp / 'a/b/c', tmp / 'a/b', tmp / 'a/d', tmp / 'e',
+                     tmp / 'a/b/c', 'relative']
+            with tmp.in_dir():
+                self.assertEqual(Path.mkdirs(paths), 6)
+                self.assertEqual(Path.mkdirs(paths), 0)
+            self.assertEqual(
+                sorted(p.path for p in tmp.recursedir()),
+                sorted(p.path for p in [tmp / 'a', tmp / 'a/b', tmp / 'a/b/c',
+                                        tmp / 'a/d', tmp / 'e',
+                                        tmp / 'relative']))
+
+            paths = [tmp / 'x' / str(i) / str(j)
+                     for i in range(10) for j in range(5)]
+            for options in [dict(workers=4), dict(dir_fds=True),
+                            dict(workers=4, dir_fds=True)]:
+                self.assertEqual(Path.mkdirs(paths, **options), 61)
+                self.assertTrue((tmp / 'x/9/4').is_dir())
+                (tmp / 'x').rmtree()
+
+            # Directories that already exist are never created again
+            made = []
+            real_mkdir = os.mkdir
+
+            def mkdir(path, *args, **kwargs):
+                made.append(path)
+                return real_mkdir(path, *args, **kwargs)
+            os.mkdir = mkdir
+            try:
+                self.assertEqual(Path.mkdirs([tmp / 'a/b/new1',
+                                              tmp / 'a/b/new2/sub']), 3)
+            finally:
+                os.mkdir = real_mkdir
+            self.assertEqual(sorted(made),
+                             [(tmp / 'a/b/new1').path,
+                              (tmp / 'a/b/new2').path,
+                              (tmp / 'a/b/new2/sub').path])
+
+            (tmp / 'file').open('w').close()
+            self.assertRaises(OSError, Path.mkdirs, [tmp / 'file/sub'])
+        finally:
+            tmp.rmtree()
+
+    def test_bulk_move(self):
+        """Tests bulk_move()."""
+        tmp = Path.tempdir()
+        try:
+            for name in ('a', 'b', 'c', 'd', 'dir/in', 'dir/out'):
+                (tmp / name).parent.mkdir(parents=True)
+                with (tmp / name).open('w') as fp:
+                    fp.write(name)
+            journal = tmp / 'journal'
+            counts = Path.bulk_move(
+                [(tmp / 'a', tmp / 'b'), (tmp / 'b', tmp / 'e'),  # chain
+                 (tmp / 'c', tmp / 'd'), (tmp / 'd', tmp / 'c'),  # swap
+                 (tmp / 'dir/in', tmp / 'new/in'),  # before its parent
+                 (tmp / 'dir', tmp / 'new/dir')],
+                journal=journal, workers=4)
+            self.assertEqual(counts['rename'], 8)
+            for name, content in [('b', 'a'), ('e', 'b'), ('c', 'd'),
+                                  ('d', 'c'), ('new/in', 'dir/in'),
+                                  ('new/dir/out', 'dir/out')]:
+                self.assertEqual((tmp / name).read_text(), content)
+            self.assertEqual(
+                sorted(p.unicodename for p in tmp.listdir()),
+                ['b', 'c', 'd', 'e', 'journal', 'new'])
+            entries = [json.loads(line)
+                       for line in journal.read_text().splitlines()]
+            self.assertEqual(len([e for e in entries if 'op' in e]), 8)
+            self.assertEqual(len([e for e in entries if 'done' in e]), 8)
+
+            self.assertRaises(ValueError, Path.bulk_move,
+                              {tmp / 'b': tmp / 'b/sub'})
+            self.assertRaises(OSError, Path.bulk_move, {tmp / 'b': tmp / 'c'})
+
+            # Failure is rolled back
+            with self.assertRaises(shutil.Error):
+                Path.bulk_move({tmp / 'b': tmp / 'f',
+                                tmp / 'c': tmp / 'e/sub'},
+                               journal=journal)
+            self.assertEqual((tmp / 'b').read_text(), 'a')
+            self.assertFalse((tmp / 'f').exists())
+            self.assertTrue(any('undone' in json.loads(line)
+                                for line in journal.read_text().splitlines()))
+
+            # Interrupted after the first rename, before it was recorded
+            with journal.open('w') as fp:
+                for i, (src, dst) in enumerate([('e', 'g'), ('b', 'e')]):
+                    fp.write(unicode(json.dumps(
+                        {'op': i, 'level': i, 'kind': 'rename',
+                         'src': unicode(tmp / src),
+                         'dst': unicode(tmp / dst)})) + '\n')
+            (tmp / 'e').rename(tmp / 'g')
+            self.assertEqual(Path.resume_bulk_move(journal)['rename'], 1)
+            self.assertEqual((tmp / 'g').read_text(), 'b')
+            self.assertEqual((tmp / 'e').read_text(), 'a')
+            self.assertFalse((tmp / 'b').exists())
+
+            # Across filesystems
+            if (os.path.isdir('/dev/shm') and
+                    os.stat('/dev/shm').st_dev != tmp.stat().st_dev):
+                other = Path.tempdir(dir='/dev/shm')
+                try:
+                    counts = Path.bulk_move({tmp / 'new': other / 'new',
+                                             tmp / 'g': other / 'g'})
+                    self.assertEqual(counts['copy'], 2)
+                    self.assertEqual((other / 'new/dir/out').read_text(),
+                                     'dir/out')
+                    self.assertEqual((other / 'g').read_text(), 'b')
+                    self.assertFalse((tmp / 'new').exists())
+                    self.assertEqual(sorted(other.listdir()),
+                                     [other / 'g', other / 'new'])
+                finally:
+                    other.rmtree()
+        finally:
+            tmp.rmtree()
+
+    def test_memfile(self):
+        """Tests memfile()."""
+        with Path.memfile(prefix='test') as (fd, path):
+            os.write(fd, b'content')
+            self.assertEqual(path.read_bytes(), b'content')
+        self.assertRaises(OSError, os.fstat, fd)
+        if not sys.platform.startswith('linux'):
+            self.assertFalse(path.exists())
+
+        # Duplicated descriptor owned by the caller
+        with Path.memfile() as (fd, path):
+            with path.open('w') as fp:
+                fp.write('text')
+            with os.fdopen(os.dup(fd), 'rb') as fp:
+                self.assertEqual(fp.read(), b'text')
+            self.assertEqual(os.fstat(fd).st_size, 4)
+
+    def test_tempdirpool(self):
+        """Tests TempDirPool."""
+        with TempDirPool(size=1) as pool:
+            with pool.scratch() as first:
+                self.assertEqual(first.listdir(), [])
+                (first / 'dir/sub').mkdir(parents=True)
+                (first / 'dir/sub/file').open('w').close()
+                (first / 'file').open('w').close()
+                with pool.scratch() as second:
+                    self.assertNotEqual(first, second)
+                    (second / 'file').open('w').close()
+            # second was recycled, first was deleted (pool is full)
+            self.assertTrue(second.is_dir())
+            self.assertFalse(first.exists())
+            with pool.scratch() as third:
+                self.assertEqual(third, second)
+                self.assertEqual(third.listdir(), [])
+            with pool.scratch() as third:
+                (third / 'dir').mkdir()
+                (third / 'dir').chmod(0o500)
+                third.chmod(0o500)
+        self.assertFalse(second.exists())
+        self.assertRaises(ValueError, pool.acquire)
+
     def test_rel_path_to(self):
         self.assertEqual(Path('some/prefix/and/a/directory/').rel_path_to(
                          'some/prefix/path/to/cat.jpg'),
@@ -81,6 +258,858 @@ class TestConcrete(unittest.TestCase):
         finally:
             tmp.rmtree()
 
+    def test_info(self):
+        """Tests info()."""
+        tmp = Path.tempdir()
+        try:
+            with tmp.open('wb', 'file') as fp:
+                fp.write(b"Some content\n")
+            info = (tmp / 'file').info()
+            self.assertTrue(info.is_file)
+            self.assertFalse(info.is_dir)
+            self.assertFalse(info.is_link)
+            self.assertEqual(info.size, 13)
+            self.assertEqual(info.mtime_ns // 1000000000,
+                             int((tmp / 'file').mtime()))
+            info = tmp.info()
+            self.assertTrue(info.is_dir)
+            self.assertFalse(info.is_file)
+            if issubclass(Path, PosixPath):
+                (tmp / 'link').symlink('file')
+                info = (tmp / 'link').info()
+                self.assertTrue(info.is_link)
+                self.assertTrue(info.is_file)
+                self.assertEqual(info.size, 13)
+                info = (tmp / 'link').info(follow_links=False)
+                self.assertTrue(info.is_link)
+                self.assertFalse(info.is_file)
+        finally:
+            tmp.rmtree()
+
+    def test_stat_many(self):
+        """Tests stat_many()."""
+        tmp = Path.tempdir()
+        try:
+            paths = []
+            for i in range(20):
+                with tmp.open('wb', 'file%d' % i) as fp:
+                    fp.write(b'x' * i)
+                paths.append(tmp / ('file%d' % i))
+            paths.insert(5, tmp / 'missing')
+
+            results = list(Path.stat_many(paths, workers=4))
+            self.assertEqual([p for p, r in results], paths)
+            self.assertTrue(isinstance(results[5][1], OSError))
+            self.assertEqual([r.st_size for p, r in results if p != paths[5]],
+                             list(range(20)))
+
+            errors = []
+            results = dict(Path.stat_many(paths, workers=4, ordered=False,
+                                          handle_errors=errors.append))
+            self.assertEqual(errors, [paths[5].path])
+            self.assertEqual(set(results), set(paths) - set([paths[5]]))
+            self.assertEqual(results[tmp / 'file7'].st_size, 7)
+        finally:
+            tmp.rmtree()
+
+    def test_snapshot(self):
+        """Tests snapshot() and Snapshot.diff()."""
+        tmp = Path.tempdir()
+        try:
+            for name in ('a', 'b', 'c', 'd'):
+                with tmp.open('wb', name) as fp:
+                    fp.write(b'content')
+            sub = tmp.mkdir('sub')
+            with sub.open('wb', 'e') as fp:
+                fp.write(b'content')
+            snap1 = tmp.snapshot()
+            self.assertEqual(set(snap1),
+                             set(Path(n) for n in ('a', 'b', 'c', 'd', 'sub',
+                                                   'sub/e')))
+            self.assertEqual(snap1[Path('sub')].type, 'd')
+            self.assertEqual(snap1[Path('sub/e')].size, 7)
+
+            with tmp.open('ab', 'a') as fp:
+                fp.write(b' modified')
+            with sub.open('ab', 'e') as fp:
+                fp.write(b' modified')
+            (tmp / 'b').remove()
+            (tmp / 'c').rename(tmp / 'sub/c')
+            with tmp.open('wb', 'f') as fp:
+                fp.write(b'new')
+
+            for snap2 in (tmp.snapshot(), tmp.snapshot(previous=snap1)):
+                diff = snap1.diff(snap2)
+                self.assertEqual(diff.added, set([Path('f')]))
+                self.assertEqual(diff.removed, set([Path('b')]))
+                self.assertEqual(diff.modified,
+                                 set([Path('a'), Path('sub/e')]))
+                self.assertEqual(diff.moved, set([(Path('c'),
+                                                   Path('sub/c'))]))
+            self.assertEqual(snap2.diff(tmp.snapshot(previous=snap2)),
+                             (set(), set(), set(), set()))
+        finally:
+            tmp.rmtree()
+
+    def test_index(self):
+        """Tests index() and TreeIndex."""
+        tmp = Path.tempdir()
+        try:
+            tree = tmp.mkdir('tree')
+            for name in ('a.txt', 'b.bin'):
+                with tree.open('wb', name) as fp:
+                    fp.write(b'content')
+            sub = tree.mkdir('sub')
+            with sub.open('wb', 'c.txt') as fp:
+                fp.write(b'more content')
+            sub.mkdir('nested')
+
+            with tree.index(tmp / 'index.db') as index:
+                self.assertEqual(len(index), 5)
+                self.assertEqual(list(index.query('*.txt')),
+                                 [tree / 'a.txt', tree / 'sub/c.txt'])
+                self.assertEqual(list(index.query('/sub/*.txt')),
+                                 [tree / 'sub/c.txt'])
+                self.assertEqual(list(index.query(prefix='sub')),
+                                 [sub, sub / 'c.txt', sub / 'nested'])
+                self.assertEqual(list(index.query(prefix=sub, type='d')),
+                                 [sub, sub / 'nested'])
+                self.assertEqual(list(index.query(type='f', min_size=10)),
+                                 [tree / 'sub/c.txt'])
+
+            (tree / 'a.txt').remove()
+            sub.rmtree()
+            with tree.open('wb', 'sub') as fp:
+                fp.write(b'now a file')
+            with tree.open('wb', 'd.txt') as fp:
+                fp.write(b'new')
+
+            with tree.index(tmp / 'index.db') as index:
+                self.assertEqual(
+                    list(index.query()),
+                    [tree / 'b.bin', tree / 'd.txt', tree / 'sub'])
+                self.assertEqual(list(index.query(type='f', max_size=5)),
+                                 [tree / 'd.txt'])
+
+            if (issubclass(Path, PosixPath) and
+                    not (hasattr(os, 'geteuid') and os.geteuid() == 0)):
+                locked = tree.mkdir('locked')
+                locked.open('wb', 'e.txt').close()
+                with tree.index(tmp / 'index.db') as index:
+                    self.assertIn(locked / 'e.txt', list(index.query()))
+                    locked.open('wb', 'f.txt').close()
+                    locked.chmod(0o300)
+                    errors = []
+                    try:
+                        self.assertRaises(OSError, index.refresh)
+                        index.refresh(handle_errors=errors.append)
+                        self.assertEqual(errors, [locked.path])
+                        self.assertEqual(list(index.query(prefix=locked)),
+                                         [locked])
+                    finally:
+                        locked.chmod(0o700)
+                    index.refresh(handle_errors=errors.append)
+                    self.assertEqual(
+                        list(index.query(prefix=locked)),
+                        [locked, locked / 'e.txt', locked / 'f.txt'])
+                    self.assertEqual(len(errors), 1)
+
+            with self.assertRaises(ValueError):
+                tmp.index(tmp / 'index.db', refresh=False)
+        finally:
+            tmp.rmtree()
+
+    @linux_only
+    def test_watch(self):
+        """Tests watch()."""
+        tmp = Path.tempdir()
+        try:
+            tmp.mkdir('ignored')
+            with tmp.watch(pattern='/sub/*.txt') as watcher:
+                self.assertEqual(watcher.read(timeout=0), [])
+                sub = tmp.mkdir('sub')
+                with sub.open('wb', 'file.txt') as fp:
+                    fp.write(b'content')
+                tmp.open('wb', 'ignored/file.txt').close()
+                tmp.open('wb', 'other.txt').close()
+                self.assertEqual(watcher.read(timeout=5),
+                                 [(sub / 'file.txt', 'created', False)])
+                (sub / 'file.txt').remove()
+                self.assertEqual(watcher.read(timeout=5),
+                                 [(sub / 'file.txt', 'deleted', False)])
+                # Filtered-out events don't make read() ignore the timeout
+                tmp.open('wb', 'other2.txt').close()
+                self.assertEqual(watcher.read(timeout=0.5), [])
+
+            # A pattern without a slash matches at any depth
+            with tmp.watch(pattern='*.txt') as watcher:
+                tmp.open('wb', 'sub/new.txt').close()
+                tmp.open('wb', 'sub/new.bin').close()
+                self.assertEqual(watcher.read(timeout=5),
+                                 [(sub / 'new.txt', 'created', False)])
+
+            # A steady stream of events doesn't delay the batch forever
+            with tmp.watch(latency=0.2) as watcher:
+                stop = threading.Event()
+
+                def produce():
+                    i = 0
+                    while not stop.wait(0.02):
+                        tmp.open('wb', 'stream%d' % i).close()
+                        i += 1
+                producer = threading.Thread(target=produce)
+                producer.start()
+                try:
+                    start = time.time()
+                    self.assertTrue(watcher.read(timeout=5))
+                    self.assertLess(time.time() - start, 1)
+                finally:
+                    stop.set()
+                    producer.join()
+        finally:
+            tmp.rmtree()
+
+    @linux_only
+    @asyncio_only
+    def test_watch_async(self):
+        """Tests watch() with asynchronous iteration."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        tmp = Path.tempdir()
+        try:
+            with tmp.watch(latency=0.2) as watcher:
+                future = watcher.__anext__()
+                loop.call_later(0.05, lambda: tmp.open('wb', 'a').close())
+                loop.call_later(0.1, lambda: tmp.open('wb', 'b').close())
+                self.assertEqual(loop.run_until_complete(future),
+                                 (tmp / 'a', 'created', False))
+                # Second event was batched with the first one
+                self.assertEqual(list(watcher._pending),
+                                 [(tmp / 'b', 'created', False)])
+                watcher._pending.clear()
+
+                # A steady stream of events doesn't delay the batch forever
+                def produce(i):
+                    tmp.open('wb', 'stream%d' % i).close()
+                    if i < 100:
+                        loop.call_later(0.02, produce, i + 1)
+                loop.call_soon(produce, 0)
+                coro = watcher.__anext__()
+                self.assertTrue(asyncio.iscoroutine(coro))
+                start = time.time()
+                loop.run_until_complete(coro)
+                self.assertLess(time.time() - start, 1)
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            tmp.rmtree()
+
+    def test_copy(self):
+        """Tests copyfile(), copy() and copytree() strategies."""
+        tmp = Path.tempdir()
+        try:
+            src = tmp.mkdir('src')
+            content = b'some content\n' * 100000
+            with src.open('wb', 'file') as fp:
+                fp.write(content)
+            src.mkdir('sub').open('wb', 'empty').close()
+
+            used = (src / 'file').copyfile(tmp / 'copy')
+            self.assertIn(used, COPY_STRATEGIES)
+            with tmp.open('rb', 'copy') as fp:
+                self.assertEqual(fp.read(), content)
+            self.assertEqual((src / 'file').copy(tmp, strategy='readinto'),
+                             'readinto')
+            self.assertEqual((tmp / 'file').size(), len(content))
+            used = (src / 'file').copy(tmp / 'copy2',
+                                       strategy=['sendfile', 'readinto'])
+            self.assertIn(used, ['sendfile', 'readinto'])
+            self.assertEqual((tmp / 'copy2').size(), len(content))
+            self.assertRaises(ValueError, (src / 'file').copyfile,
+                              tmp / 'copy', strategy='carrier pigeon')
+
+            used = src.copytree(tmp / 'dst')
+            self.assertEqual(sum(used.values()), 2)
+            with tmp.open('rb', 'dst/file') as fp:
+                self.assertEqual(fp.read(), content)
+            self.assertTrue((tmp / 'dst/sub/empty').is_file())
+        finally:
+            tmp.rmtree()
+
+    @posix_only
+    def test_copy_sparse(self):
+        """Tests copyfile() with sparse=True."""
+        tmp = Path.tempdir()
+        try:
+            size = 64 * 1024 * 1024
+            with tmp.open('wb', 'sparse') as fp:
+                fp.write(b'start')
+                fp.seek(size // 2)
+                fp.write(b'middle')
+                fp.truncate(size)
+            used = (tmp / 'sparse').copyfile(tmp / 'copy', sparse=True)
+            self.assertEqual((tmp / 'copy').size(), size)
+            with tmp.open('rb', 'copy') as fp:
+                self.assertEqual(fp.read(5), b'start')
+                fp.seek(size // 2)
+                self.assertEqual(fp.read(6), b'middle')
+                self.assertEqual(fp.read(), b'\0' * (size // 2 - 6))
+            if used in ('sparse', 'reflink'):
+                self.assertLess((tmp / 'copy').stat().st_blocks * 512,
+                                size // 2)
+        finally:
+            tmp.rmtree()
+
+    def test_copytree_parallel(self):
+        """Tests copytree() with workers and a progress callback."""
+        tmp = Path.tempdir()
+        try:
+            src = tmp.mkdir('src')
+            for i in range(5):
+                d = src.mkdir('dir%d' % i)
+                for j in range(10):
+                    with d.open('wb', 'file%d' % j) as fp:
+                        fp.write(b'x' * j)
+            os.utime((src / 'dir2').path, (1000000000, 1000000000))
+            if issubclass(Path, PosixPath):
+                (src / 'link').symlink('dir1/file3')
+
+            reports = []
+            src.copytree(tmp / 'dst', symlinks=True, workers=4,
+                         progress=reports.append)
+            self.assertEqual(len(reports), 50)
+            last = reports[-1]
+            self.assertEqual((last.files, last.total_files), (50, 50))
+            self.assertEqual((last.bytes, last.total_bytes), (225, 225))
+            self.assertEqual((tmp / 'dst/dir3/file7').size(), 7)
+            self.assertEqual(int((tmp / 'dst/dir2').mtime()), 1000000000)
+            if issubclass(Path, PosixPath):
+                self.assertTrue((tmp / 'dst/link').is_link())
+                self.assertEqual((tmp / 'dst/link').read_link(),
+                                 Path('dir1/file3'))
+                src.copytree(tmp / 'dst2', workers=4)
+                self.assertFalse((tmp / 'dst2/link').is_link())
+                self.assertEqual((tmp / 'dst2/link').size(), 3)
+        finally:
+            tmp.rmtree()
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), "Needs named pipes")
+    def test_copy_special_files(self):
+        """Tests that copies refuse special files instead of blocking."""
+        tmp = Path.tempdir()
+        try:
+            src = tmp.mkdir('src')
+            with src.open('wb', 'file') as fp:
+                fp.write(b'data')
+            os.mkfifo((src / 'fifo').path)
+            self.assertRaises(shutil.SpecialFileError,
+                              (src / 'fifo').copyfile, tmp / 'copy')
+            for method in (src.copytree, src.sync_to):
+                with self.assertRaises(shutil.Error) as cm:
+                    method(tmp / method.__name__)
+                self.assertEqual([e[0] for e in cm.exception.args[0]],
+                                 [(src / 'fifo').path])
+                with (tmp / method.__name__).open('rb', 'file') as fp:
+                    self.assertEqual(fp.read(), b'data')
+            self.assertRaises(shutil.SpecialFileError, src.hash_tree)
+        finally:
+            tmp.rmtree()
+
+    def test_sync_to(self):
+        """Tests sync_to()."""
+        tmp = Path.tempdir()
+        try:
+            src = tmp.mkdir('src')
+            for name in ('a', 'b', 'c'):
+                with src.open('wb', name) as fp:
+                    fp.write(b'content of ' + name.encode('ascii'))
+            sub = src.mkdir('sub')
+            with sub.open('wb', 'd') as fp:
+                fp.write(b'content of d')
+
+            summary = src.sync_to(tmp / 'dst', workers=4)
+            self.assertEqual(sorted(summary.copied),
+                             [Path('a'), Path('b'), Path('c'), Path('sub'),
+                              Path('sub/d')])
+            self.assertEqual(summary.unchanged, 0)
+            with tmp.open('rb', 'dst/sub/d') as fp:
+                self.assertEqual(fp.read(), b'content of d')
+
+            with src.open('wb', 'b') as fp:
+                fp.write(b'new content of b')
+            (src / 'c').remove()
+            summary = src.sync_to(tmp / 'dst')
+            self.assertEqual(summary.copied, [Path('b')])
+            self.assertEqual(summary.deleted, [])
+            self.assertEqual(summary.unchanged, 2)
+            self.assertTrue((tmp / 'dst/c').exists())
+            summary = src.sync_to(tmp / 'dst', delete=True, compare='hash')
+            self.assertEqual(summary, ([], [], [Path('c')], 3))
+            self.assertFalse((tmp / 'dst/c').exists())
+            with tmp.open('rb', 'dst/b') as fp:
+                self.assertEqual(fp.read(), b'new content of b')
+
+            # Times within modify_window are considered equal
+            os.utime((src / 'a').path, (1000000000, 1000000000))
+            os.utime((tmp / 'dst/a').path, (1000000001, 1000000001))
+            summary = src.sync_to(tmp / 'dst', modify_window=2)
+            self.assertEqual(summary, ([], [], [], 3))
+            summary = src.sync_to(tmp / 'dst')
+            self.assertEqual(summary, ([Path('a')], [], [], 2))
+
+            if issubclass(Path, PosixPath):
+                # Permissions are synced even if the content is unchanged
+                (src / 'b').chmod(0o600)
+                summary = src.sync_to(tmp / 'dst')
+                self.assertEqual(summary, ([], [], [], 3))
+                self.assertEqual((tmp / 'dst/b').stat().st_mode & 0o777,
+                                 0o600)
+                # So are the times of symbolic links
+                (src / 'link').symlink('a')
+                src.sync_to(tmp / 'dst')
+                if os.utime in getattr(os, 'supports_follow_symlinks', ()):
+                    os.utime((src / 'link').path, (1000000000, 1000000000),
+                             follow_symlinks=False)
+                    summary = src.sync_to(tmp / 'dst')
+                    self.assertEqual(summary, ([], [], [], 3))
+                    self.assertEqual(
+                        int((tmp / 'dst/link').lstat().st_mtime), 1000000000)
+                (src / 'link').remove()
+                src.sync_to(tmp / 'dst', delete=True)
+
+            if hasattr(os, 'link'):
+                with src.open('wb', 'a') as fp:
+                    fp.write(b'changed a')
+                summary = src.sync_to(tmp / 'dst2', link_dest=tmp / 'dst')
+                self.assertEqual(sorted(summary.linked),
+                                 [Path('b'), Path('sub/d')])
+                self.assertEqual(sorted(summary.copied),
+                                 [Path('a'), Path('sub')])
+                self.assertTrue((tmp / 'dst2/b').same_file(tmp / 'dst/b'))
+        finally:
+            tmp.rmtree()
+
+    def test_rmtree_parallel(self):
+        """Tests rmtree() with workers."""
+        tmp = Path.tempdir()
+        try:
+            outside = tmp.mkdir('outside')
+            outside.open('wb', 'keep').close()
+            tree = tmp.mkdir('tree')
+            for i in range(5):
+                d = tree.mkdir('dir%d' % i)
+                for j in range(10):
+                    d.open('wb', 'file%d' % j).close()
+                d.mkdir('nested').open('wb', 'file').close()
+            tree.open('wb', 'file').close()
+            # A single deep subdirectory holding most of the tree
+            deep = tree / 'deep'
+            for i in range(8):
+                deep = deep.mkdir('level%d' % i, parents=True)
+                for j in range(4):
+                    deep.mkdir('side%d' % j).open('wb', 'file').close()
+            if issubclass(Path, PosixPath):
+                (tree / 'dir1/link').symlink(outside)
+                self.assertRaises(OSError,
+                                  (tree / 'dir1/link').rmtree, workers=4)
+            tree.rmtree(workers=4)
+            self.assertFalse(tree.exists())
+            self.assertTrue((outside / 'keep').exists())
+            self.assertRaises(OSError, tree.rmtree, workers=4)
+            tree.rmtree(ignore_errors=True, workers=4)
+
+            if (issubclass(Path, PosixPath) and hasattr(Path, 'open_dir') and
+                    not (hasattr(os, 'geteuid') and os.geteuid() == 0)):
+                locked = tree.mkdir('a/locked', parents=True)
+                for name in ('f1', 'f2'):
+                    locked.open('wb', name).close()
+                locked.chmod(0o500)
+                try:
+                    with self.assertRaises(shutil.Error) as cm:
+                        tree.rmtree(workers=4)
+                    self.assertEqual(
+                        sorted(e.filename for e in cm.exception.args[0]),
+                        sorted([(locked / 'f1').path, (locked / 'f2').path,
+                                locked.path, (tree / 'a').path, tree.path]))
+                finally:
+                    locked.chmod(0o700)
+        finally:
+            tmp.rmtree()
+
+    @unittest.skipUnless(hasattr(Path, 'open_dir'), "No dir_fd support")
+    def test_open_dir(self):
+        """Tests open_dir() and DirHandle."""
+        tmp = Path.tempdir()
+        try:
+            with tmp.open_dir() as d:
+                with d.open('file', 'wb') as fp:
+                    fp.write(b'content')
+                self.assertEqual(d.stat('file').st_size, 7)
+                d.mkdir('sub')
+                self.assertTrue(d.info('sub').is_dir)
+                d.symlink('link', 'file')
+                self.assertTrue(d.info('link').is_link)
+                self.assertEqual(d.info('link').size, 7)
+                self.assertEqual(sorted(d.listdir()),
+                                 [Path('file'), Path('link'), Path('sub')])
+                with d.open_dir('sub') as sub:
+                    d.rename('file', 'moved', target_dir=sub)
+                    self.assertEqual(sub.listdir(), [Path('moved')])
+                    with sub.open('moved', 'rb') as fp:
+                        self.assertEqual(fp.read(), b'content')
+                    sub.remove('moved')
+                d.rmdir('sub')
+                d.remove('link')
+                self.assertEqual(d.listdir(), [])
+        finally:
+            tmp.rmtree()
+
+    def test_read_many(self):
+        """Tests read_many()."""
+        tmp = Path.tempdir()
+        try:
+            paths = []
+            for i in range(20):
+                path = tmp / ('f%d' % i)
+                with path.open('wb') as fp:
+                    fp.write(b'content %d\r\n' % i * (i * 10))
+                paths.append(path)
+            paths.append(tmp / 'missing')
+            for workers in (None, 4):
+                results = dict(Path.read_many(paths, workers=workers,
+                                              max_bytes=1000))
+                self.assertEqual(set(results), set(paths))
+                for i in range(20):
+                    self.assertEqual(results[paths[i]],
+                                     b'content %d\r\n' % i * (i * 10))
+                self.assertIsInstance(results[tmp / 'missing'],
+                                      EnvironmentError)
+
+            errors = []
+            results = dict(Path.read_many(paths, 'r', workers=4,
+                                          encoding='ascii',
+                                          handle_errors=errors.append))
+            self.assertEqual(len(results), 20)
+            self.assertEqual(results[paths[3]], 'content 3\n' * 30)
+            self.assertEqual(errors, [(tmp / 'missing').path])
+
+            # Stopping early doesn't leave threads waiting for budget
+            results = Path.read_many(paths, workers=4, max_bytes=1)
+            next(results)
+            results.close()
+        finally:
+            tmp.rmtree()
+
+    @unittest.skipUnless(PY3, "mmap() needs Python 3")
+    def test_mmap(self):
+        """Tests mmap()."""
+        tmp = Path.tempdir()
+        try:
+            content = b''.join(b'%08d' % i for i in range(10000))
+            with tmp.open('wb', 'file') as fp:
+                fp.write(content)
+            with (tmp / 'file').mmap(advice='sequential') as view:
+                self.assertEqual(len(view), len(content))
+                self.assertEqual(view[8:16].tobytes(), b'00000001')
+                self.assertTrue(view.readonly)
+            with (tmp / 'file').mmap(offset=8001, length=15) as view:
+                self.assertEqual(view.tobytes(), content[8001:8016])
+            with (tmp / 'file').mmap('w', offset=16, length=8) as view:
+                view[:] = b'xxxxxxxx'
+            with tmp.open('rb', 'file') as fp:
+                self.assertEqual(fp.read(32), b'0000000000000001xxxxxxxx'
+                                              b'00000003')
+
+            tmp.open('wb', 'empty').close()
+            with (tmp / 'empty').mmap() as view:
+                self.assertEqual(len(view), 0)
+
+            # Derived views can't outlive the mapping
+            with self.assertRaises(BufferError):
+                with (tmp / 'file').mmap() as view:
+                    kept = view[8:16]
+            self.assertEqual(kept.tobytes(), b'00000001')
+            kept.release()
+        finally:
+            tmp.rmtree()
+
+    def test_read(self):
+        """Tests iter_chunks(), read_bytes() and read_text()."""
+        tmp = Path.tempdir()
+        try:
+            content = b'line\r\n' * 5000 + b'r\xC3\xA9mi\rlast'
+            with tmp.open('wb', 'file') as fp:
+                fp.write(content)
+            path = tmp / 'file'
+            self.assertEqual(path.read_bytes(), content)
+            self.assertEqual(path.read_text('utf-8'),
+                             'line\n' * 5000 + 'r\xE9mi\nlast')
+
+            chunks = [c.tobytes() for c in path.iter_chunks(4096)]
+            self.assertEqual(len(chunks), 8)
+            self.assertEqual(b''.join(chunks), content)
+            buf = bytearray(10000)
+            views = path.iter_chunks(buffer=buf)
+            self.assertEqual(next(views).tobytes(), content[:10000])
+            self.assertEqual(bytes(buf), content[:10000])
+            views.close()
+
+            tmp.open('wb', 'empty').close()
+            self.assertEqual((tmp / 'empty').read_bytes(), b'')
+            self.assertEqual(list((tmp / 'empty').iter_chunks()), [])
+        finally:
+            tmp.rmtree()
+
+    def test_hash(self):
+        """Tests hash() and hash_tree()."""
+        tmp = Path.tempdir()
+        try:
+            tree = tmp.mkdir('tree')
+            with tree.open('wb', 'file') as fp:
+                fp.write(b'content')
+            sub = tree.mkdir('sub')
+            for i in range(10):
+                with sub.open('wb', 'file%d' % i) as fp:
+                    fp.write(b'content %d' % i)
+            self.assertEqual((tree / 'file').hash(),
+                             hashlib.sha256(b'content').hexdigest())
+            self.assertEqual((tree / 'file').hash('md5'),
+                             hashlib.md5(b'content').hexdigest())
+
+            digest, digests = tree.hash_tree(workers=4, cache=tmp / 'cache')
+            self.assertEqual(len(digests), 12)
+            self.assertEqual(digests[Path('file')],
+                             hashlib.sha256(b'content').hexdigest())
+            self.assertEqual(tree.hash_tree(), (digest, digests))
+
+            # Change the content without changing the metadata: the cache
+            # doesn't see it
+            st = (tree / 'file').stat()
+            with tree.open('wb', 'file') as fp:
+                fp.write(b'CONTENT')
+            os.utime((tree / 'file').path, (st.st_atime, st.st_mtime))
+            if hasattr(st, 'st_mtime_ns'):
+                os.utime((tree / 'file').path,
+                         ns=(st.st_atime_ns, st.st_mtime_ns))
+                self.assertEqual(
+                    tree.hash_tree(cache=tmp / 'cache'), (digest, digests))
+            digest2, digests2 = tree.hash_tree()
+            self.assertNotEqual(digest2, digest)
+            self.assertEqual(digests2[Path('sub')], digests[Path('sub')])
+
+            # After a change, only the directories containing it are hashed
+            class CountingCache(HashCache):
+                def set_directory(self, st, *args):
+                    hashed.append(st.st_ino)
+                    HashCache.set_directory(self, st, *args)
+            with CountingCache((tmp / 'cache').path) as cache:
+                hashed = []
+                digest3, digests3 = tree.hash_tree(cache=cache)
+                hashed = []
+                self.assertEqual(tree.hash_tree(cache=cache),
+                                 (digest3, digests3))
+                self.assertEqual(hashed, [])
+                with sub.open('wb', 'file3') as fp:
+                    fp.write(b'changed')
+                digest4, digests4 = tree.hash_tree(cache=cache)
+                self.assertEqual(hashed, [sub.stat().st_ino,
+                                          tree.stat().st_ino])
+                self.assertNotEqual(digest4, digest3)
+                self.assertEqual(digests4[Path('sub')],
+                                 tree.hash_tree()[1][Path('sub')])
+        finally:
+            tmp.rmtree()
+
+    def test_find_duplicates(self):
+        """Tests find_duplicates()."""
+        tmp = Path.tempdir()
+        try:
+            big = b'x' * 20000
+            files = {'a': b'small', 'b': b'small', 'c': b'other',
+                     'sub/d': big + b'1', 'sub/e': big + b'1',
+                     'sub/f': big + b'2', 'g': b'', 'h': b''}
+            tmp.mkdir('sub')
+            for name, content in files.items():
+                with tmp.open('wb', name) as fp:
+                    fp.write(content)
+            if hasattr(os, 'link'):
+                (tmp / 'a').hardlink(tmp / 'hardlink')
+            dups = sorted(tmp.find_duplicates(workers=4))
+            self.assertEqual(len(dups), 2)
+            # Only one of the hard links is reported
+            self.assertEqual(len(dups[0]), 2)
+            self.assertIn(tmp / 'b', dups[0])
+            self.assertEqual(dups[1], [tmp / 'sub/d', tmp / 'sub/e'])
+            dups = list(tmp.find_duplicates('/sub/*'))
+            self.assertEqual(dups, [[tmp / 'sub/d', tmp / 'sub/e']])
+            dups = sorted(tmp.find_duplicates(min_size=0))
+            self.assertEqual(len(dups), 3)
+        finally:
+            tmp.rmtree()
+
+    def test_disk_usage(self):
+        """Tests disk_usage()."""
+        tmp = Path.tempdir()
+        try:
+            for name, size in [('a', 100), ('sub/b', 1000), ('sub/c', 10),
+                               ('sub/nested/d', 10000), ('other/e', 1)]:
+                (tmp / name).parent.mkdir(parents=True)
+                with tmp.open('wb', name) as fp:
+                    fp.write(b'x' * size)
+            if hasattr(os, 'link'):
+                (tmp / 'sub/b').hardlink(tmp / 'other/b')
+
+            def dir_size(*names):
+                return sum((tmp / n).lstat().st_size for n in names)
+            usage = tmp.disk_usage(apparent=True, workers=4)
+            dirs = ('.', 'sub', 'sub/nested', 'other')
+            self.assertEqual(set(usage), set(Path(d) for d in dirs))
+            self.assertEqual(usage[Path('sub/nested')],
+                             10000 + dir_size('sub/nested'))
+            self.assertEqual(usage[Path('.')], 11111 + dir_size(*dirs))
+            self.assertEqual(usage[Path('sub')] + usage[Path('other')],
+                             11011 + dir_size('sub', 'sub/nested', 'other'))
+
+            usage = tmp.disk_usage(by_depth=1)
+            self.assertEqual(set(usage),
+                             set([Path('.'), Path('sub'), Path('other')]))
+            self.assertEqual(list(tmp.disk_usage(by_depth=0)), [Path('.')])
+
+            if (issubclass(Path, PosixPath) and
+                    not (hasattr(os, 'geteuid') and os.geteuid() == 0)):
+                (tmp / 'sub/nested').chmod(0)
+                try:
+                    self.assertRaises(OSError, tmp.disk_usage, workers=4)
+                    errors = []
+                    usage = tmp.disk_usage(apparent=True, workers=4,
+                                           handle_errors=errors.append)
+                    self.assertEqual(errors, [(tmp / 'sub/nested').path])
+                    self.assertEqual(usage[Path('sub/nested')],
+                                     dir_size('sub/nested'))
+                finally:
+                    (tmp / 'sub/nested').chmod(0o755)
+        finally:
+            tmp.rmtree()
+
+    def test_atomic_write(self):
+        """Tests atomic_write()."""
+        tmp = Path.tempdir()
+        try:
+            path = tmp / 'file'
+            with path.atomic_write() as fp:
+                fp.write('first')
+            self.assertEqual(path.read_text(), 'first')
+            if issubclass(Path, PosixPath):
+                path.chmod(0o751)
+            for fsync in ('none', 'file', 'file+dir'):
+                with tmp.atomic_write('wb', 'file', fsync=fsync) as fp:
+                    fp.write(b'second ' + fsync.encode('ascii'))
+                self.assertEqual(path.read_bytes(),
+                                 b'second ' + fsync.encode('ascii'))
+            if issubclass(Path, PosixPath):
+                self.assertEqual(path.stat().st_mode & 0o777, 0o751)
+
+            with self.assertRaises(ZeroDivisionError):
+                with path.atomic_write() as fp:
+                    fp.write('third')
+                    1 / 0
+            self.assertEqual(path.read_text(), 'second file+dir')
+            self.assertEqual(tmp.listdir(), [path])
+            self.assertRaises(ValueError, path.atomic_write(fsync='yes')
+                              .__enter__)
+        finally:
+            tmp.rmtree()
+
+    def test_batch_writer(self):
+        """Tests batch_writer()."""
+        tmp = Path.tempdir()
+        try:
+            (tmp / 'sub').mkdir()
+            (tmp / 'a').open('w').close()
+            if issubclass(Path, PosixPath):
+                (tmp / 'a').chmod(0o640)
+            for sync in ('auto', 'fsync', 'none'):
+                with Path.batch_writer(sync) as batch:
+                    with batch.open(tmp / 'a') as fp:
+                        fp.write('a ' + sync)
+                    with batch.open(tmp / 'sub/b', 'wb') as fp:
+                        fp.write(b'b')
+                    self.assertEqual((tmp / 'a').read_text(), '')
+                self.assertEqual((tmp / 'a').read_text(), 'a ' + sync)
+                self.assertEqual((tmp / 'sub/b').read_bytes(), b'b')
+                (tmp / 'a').open('w').close()
+            if issubclass(Path, PosixPath):
+                self.assertEqual((tmp / 'a').stat().st_mode & 0o777, 0o640)
+
+            with self.assertRaises(ZeroDivisionError):
+                with Path.batch_writer() as batch:
+                    batch.open(tmp / 'a').write('new')
+                    batch.open(tmp / 'c').write('new')
+                    1 / 0
+            self.assertEqual((tmp / 'a').read_text(), '')
+            self.assertEqual(sorted(p.unicodename for p in tmp.listdir()),
+                             ['a', 'sub'])
+            self.assertEqual((tmp / 'sub').listdir(), [tmp / 'sub/b'])
+            self.assertRaises(ValueError, Path.batch_writer, 'yes')
+        finally:
+            tmp.rmtree()
+
+    @asyncio_only
+    def test_async(self):
+        """Tests the asynchronous methods."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        tmp = Path.tempdir()
+        try:
+            with AsyncExecutor(2) as executor:
+                run = loop.run_until_complete
+                data = b'0123456789' * 1000
+                path = tmp / 'file'
+                run(path.awrite_bytes(data, executor, chunk_size=300))
+                self.assertEqual(path.read_bytes(), data)
+                self.assertEqual(run(path.aread_bytes(executor, 256)), data)
+                self.assertEqual(run(path.astat(executor=executor)).st_size,
+                                 10000)
+                run(path.acopyfile(tmp / 'copy', executor, 4096))
+                self.assertEqual((tmp / 'copy').read_bytes(), data)
+                run((tmp / 'copy').aremove(executor))
+                self.assertFalse((tmp / 'copy').exists())
+                with self.assertRaises(OSError):
+                    run((tmp / 'missing').aread_bytes(executor))
+
+                fp = run(path.aopen('rb', executor=executor,
+                                    chunk_size=4096).__aenter__())
+                first = fp.read(5)
+                fp.seek(9995)
+                last = fp.read()
+                run(fp.close())
+                self.assertEqual(run(first), b'01234')
+                self.assertEqual(run(last), b'56789')
+
+                fp = path.aopen('wb', executor=executor)
+                for i in range(10):
+                    fp.write(b'%d' % i)
+                run(fp.__aexit__(None, None, None))
+                self.assertEqual(path.read_bytes(), b'0123456789')
+
+                # Cancelling stops the copy between two chunks
+                with path.open('wb') as wfp:
+                    wfp.write(data * 100)
+                future = path.acopyfile(tmp / 'copy', executor, 16)
+                loop.call_later(0.01, future.cancel)
+                with self.assertRaises(asyncio.CancelledError):
+                    run(future)
+                executor.shutdown()
+                self.assertLess((tmp / 'copy').size(), 1000000)
+                stats = executor.stats()
+                self.assertEqual((stats.workers, stats.queued, stats.running),
+                                 (2, 0, 0))
+                self.assertGreater(stats.completed, 10)
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            tmp.rmtree()
+
 
 class PathUTF8(Path):
     if os.name != 'nt':
@@ -168,6 +1197,157 @@ class TestLists(unittest.TestCase):
                            (['r\xE9pertoire\\file'],
                             [b'r\xC3\xA9pertoire/file']))
 
+    def test_recursedir_filters(self):
+        """Uses recursedir with metadata filters."""
+        self.compare_paths(self.tmp, self.tmp.recursedir(type='d'),
+                           (['r\xE9pertoire', 'r\xE9pertoire\\nested'],
+                            [b'r\xC3\xA9pertoire',
+                             b'r\xC3\xA9pertoire/nested']))
+        self.compare_paths(self.tmp, self.tmp.recursedir(type='l'),
+                           ([], [b'r\xC3\xA9pertoire/last']))
+        self.compare_paths(self.tmp, self.tmp.recursedir('*e', type='f'),
+                           (['file', 'r\xE9pertoire\\file'],
+                            [b'file', b'r\xC3\xA9pertoire/file']))
+        self.compare_paths(self.tmp, self.tmp.recursedir(max_depth=1),
+                           (['file', 'r\xE9mi\'s thing', 'r\xE9pertoire'],
+                            [b'file', b'r\xC3\xA9mi\'s thing',
+                             b'r\xC3\xA9pertoire']))
+        self.compare_paths(self.tmp,
+                           self.tmp.recursedir('/r\xE9pertoire/file',
+                                               max_depth=1),
+                           ([], []))
+
+        info = dict(self.tmp.recursedir(with_info=True))
+        self.assertTrue(info[self.tmp / 'file'].is_file)
+        self.assertTrue(info[self.tmp / 'r\xE9pertoire'].is_dir)
+
+    def test_recursedir_metadata(self):
+        """Uses recursedir with size and time filters."""
+        tmp = Path.tempdir()
+        try:
+            for name, size, mtime in [('small', 10, 1000000000),
+                                      ('big', 1000, 1000000000),
+                                      ('recent', 100, None)]:
+                with tmp.open('wb', name) as fp:
+                    fp.write(b'x' * size)
+                if mtime is not None:
+                    os.utime((tmp / name).path, (mtime, mtime))
+            self.compare_paths(tmp, tmp.recursedir(min_size=50),
+                               (['big', 'recent'], [b'big', b'recent']))
+            self.compare_paths(tmp, tmp.recursedir(max_size=100),
+                               (['small', 'recent'], [b'small', b'recent']))
+            self.compare_paths(tmp, tmp.recursedir(min_size=50,
+                                                   max_size=100),
+                               (['recent'], [b'recent']))
+            self.compare_paths(tmp, tmp.recursedir(
+                               older_than=datetime.timedelta(days=1)),
+                               (['small', 'big'], [b'small', b'big']))
+            self.compare_paths(tmp, tmp.recursedir(newer_than=1500000000),
+                               (['recent'], [b'recent']))
+        finally:
+            tmp.rmtree()
+
+
+class TestMemoryFS(unittest.TestCase):
+    """Tests for Path bound to a MemoryFS."""
+    def test_files(self):
+        fs = MemoryFS()
+        tmp = fs.Path.tempdir()
+        self.assertTrue(tmp.is_dir())
+        self.assertTrue(tmp.lies_under(fs.Path('/tmp')))
+        self.assertFalse(Path(tmp).exists())
+        (tmp / 'dir/sub').mkdir(parents=True)
+        with (tmp / 'dir/file').open('w') as fp:
+            fp.write('hello')
+        with (tmp / 'dir/file').open('ab') as fp:
+            fp.write(b' world')
+        self.assertEqual((tmp / 'dir/file').read_text(), 'hello world')
+        self.assertEqual((tmp / 'dir/file').size(), 11)
+        with (tmp / 'dir/file').open('rb') as fp:
+            self.assertRaises(IOError, fp.write, b'nope')
+        self.assertRaises(OSError, (tmp / 'missing').open)
+        self.assertRaises(OSError, (tmp / 'dir').remove)
+        self.assertRaises(OSError, (tmp / 'dir').rmdir)
+
+        (tmp / 'dir/file').chmod(0o600)
+        st = (tmp / 'dir/file').stat()
+        self.assertEqual(st.st_mode & 0o777, 0o600)
+        self.assertTrue((tmp / 'dir/file').info().is_file)
+        (tmp / 'dir/file').copy(tmp)
+        self.assertEqual((tmp / 'file').read_bytes(), b'hello world')
+        self.assertEqual((tmp / 'file').stat().st_mode & 0o777, 0o600)
+        (tmp / 'file').rename(tmp / 'dir/sub/moved')
+        self.assertFalse((tmp / 'file').exists())
+        self.assertRaises(OSError, (tmp / 'dir').rename, tmp / 'dir/sub/x')
+
+        (tmp / 'link').symlink('dir/sub')
+        self.assertTrue((tmp / 'link').is_link())
+        self.assertTrue((tmp / 'link').is_dir())
+        self.assertEqual((tmp / 'link').read_link(), fs.Path('dir/sub'))
+        self.assertEqual((tmp / 'link/moved').resolve(), tmp / 'dir/sub/moved')
+        (tmp / 'broken').symlink('nowhere')
+        self.assertTrue((tmp / 'broken').lexists())
+        self.assertFalse((tmp / 'broken').exists())
+
+        with tmp.in_dir():
+            self.assertEqual(fs.Path.cwd(), tmp)
+            self.assertEqual(fs.Path('dir').absolute(), tmp / 'dir')
+        self.assertEqual(fs.Path.cwd(), fs.Path('/'))
+
+        self.assertEqual(
+            sorted(p.path for p in tmp.recursedir()),
+            sorted(p.path for p in [tmp / 'dir', tmp / 'dir/sub',
+                                    tmp / 'dir/sub/moved', tmp / 'dir/file',
+                                    tmp / 'link', tmp / 'broken']))
+        self.assertEqual(list(tmp.recursedir('*/*/moved')),
+                         [tmp / 'dir/sub/moved'])
+
+        copy = fs.Path('/copy')
+        counts = tmp.copytree(copy, symlinks=True, workers=2)
+        self.assertEqual(counts, {'copyfileobj': 2})
+        self.assertEqual((copy / 'dir/sub/moved').read_bytes(),
+                         b'hello world')
+        self.assertEqual((copy / 'link').read_link(), fs.Path('dir/sub'))
+        self.assertTrue((tmp / 'link').same_file(tmp / 'dir/sub'))
+        self.assertFalse((copy / 'dir').same_file(tmp / 'dir'))
+        self.assertEqual(fs.Path.mkdirs([tmp / 'new/a', tmp / 'new/b/c',
+                                         tmp / 'dir/sub']), 4)
+        self.assertTrue((tmp / 'new/b/c').is_dir())
+        self.assertTrue(fs.Path('/').is_mount())
+        self.assertFalse(tmp.is_mount())
+
+        fp, path = fs.Path.tempfile(suffix='.txt', dir=tmp)
+        with fp:
+            fp.write(b'temporary')
+        self.assertEqual(path.parent, tmp)
+        self.assertEqual(path.read_bytes(), b'temporary')
+        self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+
+        self.assertRaises(NotImplementedError, tmp.sync_to, tmp / 'sync')
+        tmp.rmtree()
+        self.assertFalse(tmp.exists())
+
+    def test_listing_order(self):
+        for order, expected in [('created', ['b', 'c', 'a']),
+                                ('sorted', ['a', 'b', 'c']),
+                                ('reversed', ['a', 'c', 'b'])]:
+            fs = MemoryFS(listing_order=order)
+            root = fs.Path('/root')
+            root.mkdir()
+            for name in ('b', 'c', 'a'):
+                (root / name).open('w').close()
+            self.assertEqual([p.unicodename for p in root.listdir()],
+                             expected)
+        self.assertRaises(ValueError, MemoryFS, 'random')
+
+    def test_separate(self):
+        fs1, fs2 = MemoryFS(), MemoryFS()
+        fs1.Path('/dir').mkdir()
+        self.assertTrue(fs1.Path('/dir').is_dir())
+        self.assertFalse(fs2.Path('/dir').exists())
+        self.assertNotEqual(fs1.Path('/').stat().st_dev,
+                            fs2.Path('/').stat().st_dev)
+
 
 class TestPattern2Re(unittest.TestCase):
     """Tests the pattern2re() function, used to recognize extended patterns.